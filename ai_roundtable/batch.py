@@ -0,0 +1,202 @@
+"""Run many meetings in a process."""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+import textwrap
+from dataclasses import dataclass
+
+from .cli import exit_on_sigterm, load_config, new_meeting, new_parser, out_stream, setup_clients, setup_log
+from .data import meta, IntoDict, FromDict, Validator
+from .io import file_or, Writer
+from .log import log
+from .provider import close_clients
+from .yamlx import dumps as yaml_dumps, loads as yaml_loads
+
+
+@dataclass
+class Job(Validator, IntoDict, FromDict):
+    """Batch job definition."""
+
+    config: str = meta(desc="config file", validator=Validator.length()).field(str)
+    agenda: str = meta(desc="agenda, @file_name to specify a file").field(str, default="")
+    thread: str = meta(desc="thread file").field(str, default="")
+    out: str = meta(desc="thread output").field(str, default="")
+    eval_out: str = meta(desc="evaluation output").field(str, default="")
+    name: str = meta(desc="job name, default: index of the job").field(str, default="")
+
+
+def read_manifest(path: str) -> list[Job]:
+    """Read jobs from yaml (list of jobs) or jsonl (a job per line)."""
+    with open(path) as f:
+        content = f.read()
+    if path.endswith(".jsonl"):
+        items = [json.loads(x) for x in content.splitlines() if x.strip()]
+    else:
+        items = yaml_loads(content) or []
+    jobs = [Job.from_dict(x) for x in items]
+    for i, x in enumerate(jobs):
+        x.name = x.name or str(i)
+    return jobs
+
+
+@dataclass
+class JobResult(IntoDict):
+    """Result of a job."""
+
+    name: str = meta(desc="job name").field(str)
+    ok: bool = meta(desc="true if succeeded").field(bool)
+    messages: int = meta(desc="number of appended messages").field(int)
+    seconds: float = meta(desc="elapsed time").field(float)
+    error: str = meta(desc="error message if failed").field(str, default="")
+
+
+@dataclass
+class Report(IntoDict):
+    """Summary of a batch."""
+
+    jobs: int = meta(desc="number of jobs").field(int)
+    succeeded: int = meta(desc="number of succeeded jobs").field(int)
+    failed: int = meta(desc="number of failed jobs").field(int)
+    seconds: float = meta(desc="elapsed time").field(float)
+    jobs_per_minute: float = meta(desc="throughput of jobs").field(float)
+    messages_per_second: float = meta(desc="throughput of messages").field(float)
+    results: list[JobResult] = meta(desc="results of jobs").field(list[JobResult])
+
+    @staticmethod
+    def new(results: list[JobResult], seconds: float) -> "Report":
+        succeeded = len([x for x in results if x.ok])
+        messages = sum(x.messages for x in results)
+        return Report(
+            jobs=len(results),
+            succeeded=succeeded,
+            failed=len(results) - succeeded,
+            seconds=round(seconds, 3),
+            jobs_per_minute=round(len(results) / seconds * 60, 3) if seconds > 0 else 0,
+            messages_per_second=round(messages / seconds, 3) if seconds > 0 else 0,
+            results=results,
+        )
+
+
+async def run_job(args: argparse.Namespace, job: Job, metrics_out: Writer | None = None) -> JobResult:
+    """Run a meeting of the job, write the metrics into metrics_out."""
+    start = time.perf_counter()
+    messages = 0
+    try:
+        c = load_config(job.config, job.thread or None, args.thread_format)
+        if any(x.human for x in c.speakers):
+            raise Exception("human speakers are not supported in batch")
+        if job.agenda:
+            agenda = file_or(job.agenda)
+        elif len(c.main_thread) > 0:
+            agenda = c.main_thread.messages[0].content
+        else:
+            raise Exception("no agenda!")
+        out = out_stream(args, job.out or None)
+        eval_out = out_stream(args, job.eval_out or None)
+        meeting = new_meeting(args, c, agenda, out, eval_out, metrics_out, name=job.name)
+        begin = len(c.main_thread)
+        log().info("job[%s]: begin", job.name)
+        try:
+            await meeting.start()
+        finally:
+            messages = len(c.main_thread) - begin
+            out.close()
+            eval_out.close()
+        log().info("job[%s]: end", job.name)
+        return JobResult(name=job.name, ok=True, messages=messages, seconds=round(time.perf_counter() - start, 3))
+    except Exception as e:
+        log().exception("job[%s]: failed", job.name)
+        return JobResult(
+            name=job.name,
+            ok=False,
+            messages=messages,
+            seconds=round(time.perf_counter() - start, 3),
+            error=f"{type(e).__name__}: {e}",
+        )
+
+
+async def run(args: argparse.Namespace, jobs: list[Job], concurrency: int, metrics_out: Writer | None = None) -> Report:
+    """Run jobs concurrently, concurrency 0 means unlimited."""
+    limiter = asyncio.Semaphore(concurrency if concurrency > 0 else len(jobs) or 1)
+
+    async def limited(job: Job) -> JobResult:
+        async with limiter:
+            return await run_job(args, job, metrics_out)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[limited(x) for x in jobs])
+    return Report.new(results, time.perf_counter() - start)
+
+
+def new_batch_parser() -> argparse.ArgumentParser:
+    """Return the parser of the batch options."""
+    parser = new_parser()
+    parser.prog = f"{parser.prog} batch"
+    parser.description = "Run many meetings in a process"
+    parser.epilog = textwrap.dedent(
+        """\
+        Manifest is a yaml list of jobs or jsonl, a job per line.
+        A job has the following keys:
+
+        config: config file, required
+        agenda: agenda, @file_name to specify a file
+        thread: thread file, yaml or jsonl
+        out: thread output, yaml or jsonl
+        eval_out: evaluation output
+        name: job name, default: index of the job
+
+        The meeting options apply to all jobs.
+        Metrics of all jobs are written into --metrics_out, the meeting key is the job name.
+        Human speakers and streaming are not supported.
+
+        Example:
+        python -m ai_roundtable.cli batch jobs.yml -j 8 --max_in_flight 4 -u "http://localhost:11434/v1" -m "gemma3"
+        """
+    )
+    parser.add_argument("manifest", type=str, action="store", help="manifest file, .jsonl or .yml")
+    parser.add_argument(
+        "-j",
+        "--concurrency",
+        type=int,
+        action="store",
+        default=4,
+        help="maximum number of concurrent meetings, 0 means unlimited, default: 4",
+    )
+    parser.add_argument("-r", "--report", type=str, action="store", help="report output, default: stdout")
+    return parser
+
+
+async def main(argv: list[str]) -> int:
+    """Entry point of batch."""
+    args = new_batch_parser().parse_args(argv)
+    args.disable_stream = True  # streams of the meetings would be mixed
+    args.stream_out = None
+    setup_log(args)
+    jobs = read_manifest(args.manifest)
+    log().info("batch: %d jobs, concurrency: %d", len(jobs), args.concurrency)
+    setup_clients(args)
+    exit_on_sigterm()
+    metrics_out = out_stream(args, args.metrics_out)
+    try:
+        report = await run(args, jobs, args.concurrency, metrics_out)
+    finally:
+        metrics_out.close()
+        await close_clients()
+    log().info(
+        "batch: %d succeeded, %d failed, %.3f seconds, %.3f jobs/min",
+        report.succeeded,
+        report.failed,
+        report.seconds,
+        report.jobs_per_minute,
+    )
+    content = yaml_dumps(report.into_dict())
+    if args.report:
+        # a report per batch, not appended to the last one
+        with open(args.report, "w") as f:
+            f.write(content)
+    else:
+        sys.stdout.write(content)
+    return 0 if report.failed == 0 else 1
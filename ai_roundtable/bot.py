@@ -1,36 +1,27 @@
+import asyncio
+import random
+import time
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
-from typing import Protocol, Callable, cast, TypeVar, Generic, override
-
-from agents import Agent, Runner, TResponseInputItem, ModelProvider, RunConfig, RunResultStreaming
+from contextlib import suppress
+from dataclasses import dataclass, field
+from functools import partial
+from typing import AsyncIterator, Protocol, Callable, cast, TypeVar, Generic, override
+
+import httpx
+import openai
+from agents import Agent, Runner, ModelProvider, RunConfig, RunResultStreaming, TResponseInputItem
+from agents.result import RunResultBase
 from openai.types.responses import ResponseTextDeltaEvent
 
-from .config import MainThread, Speaker, Thread
+from .cache import Response, ResponseCache
+from .config import Builtin, Context, MainThread, Retry, Speaker, Thread, Message as ThreadMessage
 from .desc import Section
-from .io import read_user_input
-from .log import log, stream_log
-
-
-@dataclass
-class Message:
-    """Message to be sent to the Agent."""
-
-    role: str
-    content: str
-
-    @staticmethod
-    def user(content: str) -> "Message":
-        """Return a new user message."""
-        return Message(role="user", content=content)
-
-    @staticmethod
-    def assistant(content: str) -> "Message":
-        """Return a new assistant message."""
-        return Message(role="assistant", content=content)
-
-    def into_item(self) -> TResponseInputItem:
-        """Convert into Agent input."""
-        return cast(TResponseInputItem, {"role": self.role, "content": self.content})
+from .io import read_user_input_async
+from .log import log, stream_enabled, stream_flush, stream_log
+from .metrics import Metric, Metrics
+from .prompt import Message, Prompt, PromptBuilder
+from .provider import load_listener
+from .window import Window
 
 
 class BotProto(Protocol):
@@ -39,13 +30,315 @@ class BotProto(Protocol):
     async def reply(self) -> None: ...
 
 
-async def streaming(result: RunResultStreaming) -> None:
-    """Print stream_log."""
+async def text_deltas(result: RunResultStreaming) -> AsyncIterator[str]:
+    """Yield the text deltas of the result."""
     async for event in result.stream_events():
         if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
-            msg = event.data.delta
+            yield event.data.delta
+
+
+async def cached_deltas(response: Response) -> AsyncIterator[str]:
+    """Yield the text deltas of the cached response."""
+    for x in response.deltas:
+        yield x
+
+
+@dataclass
+class Echo:
+    """Print the text of the attempts of a completion once, a retry prints only beyond the text already printed."""
+
+    printed: str = ""  # by the previous attempts
+    deltas: list[str] = field(default_factory=list)  # of the current attempt
+    size: int = 0  # of the deltas
+    ahead: bool = True  # the current attempt has passed the printed text, print the deltas as they are
+
+    def retry(self) -> None:
+        """Start the next attempt, keep the printed text."""
+        if self.ahead:
+            self.printed = "".join(self.deltas)
+        self.deltas.clear()
+        self.size = 0
+        self.ahead = not self.printed
+
+    def write(self, msg: str) -> None:
+        self.deltas.append(msg)
+        if self.ahead:
             stream_log(msg)
+            return
+        n, self.size = self.size, self.size + len(msg)
+        overlap = self.printed[n : self.size]
+        if msg[: len(overlap)] != overlap:
+            self.__diverge()
+            return
+        if self.size >= len(self.printed):
+            self.ahead = True
+            stream_log(msg[len(overlap) :])
+
+    def end(self) -> None:
+        """Finish the attempt."""
+        if not self.ahead:
+            self.__diverge()
+
+    def __diverge(self) -> None:
+        log().warning("the retried reply differs from the printed text, print it on a new line")
+        self.ahead = True
+        stream_log("\n")
+        stream_log("".join(self.deltas))
+
+
+async def streaming(deltas: AsyncIterator[str], quiet: bool = False, echo: Echo | None = None) -> list[str]:
+    """Print stream_log via echo if given, only drain the deltas if quiet. Return the deltas."""
+    write = stream_log if echo is None else echo.write
+    r = []
+    async for msg in deltas:
+        r.append(msg)
+        if not quiet:
+            write(msg)
+    if not quiet:
+        if echo is not None:
+            echo.end()
+        stream_log("\n")
+        stream_flush()
+    return r
+
+
+def transient(e: Exception) -> bool:
+    """Return True if a retry may succeed, timeouts, connection errors, 429 and 5xx."""
+    match e:
+        case TimeoutError() | openai.APIConnectionError() | httpx.TransportError():
+            return True
+        case openai.APIStatusError():
+            return e.status_code == 429 or e.status_code >= 500
+    return False
+
+
+def replay(output: str) -> None:
+    """Print stream_log of the output that was generated quietly."""
+    stream_log(output)
     stream_log("\n")
+    stream_flush()
+
+
+@dataclass
+class Completion:
+    """Completion settings of bots and evaluators."""
+
+    model: str = ""  # model name, a part of the cache key
+    cache: ResponseCache | None = None
+    base_url: str = ""  # endpoint, for metrics
+    metrics: Metrics | None = None
+    retry: Retry = field(default_factory=Retry)
+    hedge: ModelProvider | None = None  # provider of the hedged requests, None means never hedge
+    hedge_model: str = ""  # for metrics
+    hedge_base_url: str = ""  # for metrics
+
+    def new_metric(self, kind: str, name: str) -> Metric:
+        return Metric(kind=kind, name=name, model=self.model, base_url=self.base_url)
+
+    def record(self, m: Metric) -> None:
+        if self.metrics is not None:
+            self.metrics.record(m)
+
+
+@dataclass
+class Request:
+    """Run of an agent in background, the text deltas are queued until read."""
+
+    name: str
+    deltas: asyncio.Queue[str | None]  # None means the end
+    task: asyncio.Task[RunResultBase]
+
+    @staticmethod
+    def start(
+        name: str, agent: Agent[None], items: list[TResponseInputItem], provider: ModelProvider, streamed: bool
+    ) -> "Request":
+        deltas: asyncio.Queue[str | None] = asyncio.Queue()
+
+        async def run() -> RunResultBase:
+            run_config = RunConfig(model_provider=provider)
+            try:
+                if not streamed:
+                    # nobody watches the stream
+                    result = await Runner.run(starting_agent=agent, input=items, run_config=run_config)
+                    deltas.put_nowait(result.final_output)
+                    return result
+                streaming = Runner.run_streamed(starting_agent=agent, input=items, run_config=run_config)
+                try:
+                    async for x in text_deltas(streaming):
+                        deltas.put_nowait(x)
+                except BaseException:
+                    streaming.cancel()
+                    raise
+                return streaming
+            finally:
+                deltas.put_nowait(None)
+
+        return Request(name=name, deltas=deltas, task=asyncio.create_task(run()))
+
+    async def stream(self, first: str | None, idle: float = 0) -> AsyncIterator[str]:
+        """Yield the first delta and the rest, raise TimeoutError if no delta for idle seconds if not 0."""
+        x = first
+        while x is not None:
+            yield x
+            x = await asyncio.wait_for(self.deltas.get(), idle or None)
+        # raise the error of the run before the end of the stream is printed
+        await asyncio.wait([self.task])
+        self.task.result()
+
+    async def cancel(self) -> None:
+        self.task.cancel()
+        with suppress(asyncio.CancelledError, Exception):
+            await self.task
+
+
+async def race(
+    requests: list[Request], hedge_after: float, new_hedge: Callable[[], Request] | None
+) -> tuple[Request, str | None]:
+    """Return the request that yields the first delta and the delta, start the hedge if no delta after hedge_after."""
+    getters = {asyncio.create_task(requests[0].deltas.get()): requests[0]}
+    timeout = hedge_after if new_hedge is not None and hedge_after > 0 else None
+    try:
+        while True:
+            done, _ = await asyncio.wait(getters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done and new_hedge is not None:
+                log().info("%s: no first token after %.3f seconds, hedge", requests[0].name, hedge_after)
+                timeout = None
+                h = new_hedge()
+                requests.append(h)
+                getters[asyncio.create_task(h.deltas.get())] = h
+                continue
+            # prefer the earlier request if both are ready
+            for g in sorted(done, key=lambda g: requests.index(getters[g])):
+                r = getters.pop(g)
+                x = g.result()
+                if x is None and getters:
+                    await asyncio.wait([r.task])
+                    if r.task.exception() is not None:
+                        log().warning("%s: failed, wait for the other: %s", r.name, r.task.exception())
+                        continue
+                return r, x
+    finally:
+        for g in getters:
+            g.cancel()
+
+
+async def complete(
+    name: str,
+    agent: Agent[None],
+    messages: list[Message],
+    model_provider: ModelProvider,
+    completion: Completion,
+    quiet: bool = False,
+    metric: Metric | None = None,
+) -> str:
+    """Run an agent and return the final output, measure the completion into metric."""
+    m = metric or completion.new_metric("", name)
+    start = m.start()
+    for i, x in enumerate(messages):
+        log().debug("input[%s][%d][%s]: %s", name, i, x.role, x.content)
+    items = [x.into_item() for x in messages]
+    cache = completion.cache
+    key = "" if cache is None else ResponseCache.key(completion.model, cast(str, agent.instructions), items)
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            log().info("%s: cached response", name)
+            await streaming(cached_deltas(cached), quiet=quiet)
+            m.mode = "cached"
+            m.ttft = m.latency = time.perf_counter() - start
+            return cached.output
+
+    async def first_token(deltas: AsyncIterator[str]) -> AsyncIterator[str]:
+        async for x in deltas:
+            if m.ttft == 0:
+                m.ttft = time.perf_counter() - start
+            yield x
+
+    def on_load(in_flight: int, queued: int) -> None:
+        m.in_flight = max(m.in_flight, in_flight)
+        m.queued = max(m.queued, queued)
+
+    m.mode = "streamed" if not quiet and stream_enabled() else "run"
+    retry = completion.retry
+    hedge = completion.hedge
+    echo = Echo()
+
+    async def attempt() -> tuple[RunResultBase, list[str]]:
+        requests = [Request.start(name, agent, items, model_provider, m.mode == "streamed")]
+        new_hedge = None
+        if hedge is not None:
+            new_hedge = partial(Request.start, f"{name}[hedge]", agent, items, hedge, m.mode == "streamed")
+        try:
+            async with asyncio.timeout(retry.timeout or None):
+                r, first = await race(requests, retry.hedge_after, new_hedge)
+            for x in requests:
+                if x is not r:
+                    await x.cancel()
+            if r is not requests[0]:
+                m.hedged = True
+                m.model = completion.hedge_model or m.model
+                m.base_url = completion.hedge_base_url or m.base_url
+            # only the winner is streamed
+            deltas = await streaming(first_token(r.stream(first, retry.timeout)), quiet=quiet, echo=echo)
+            return await r.task, deltas
+        finally:
+            for x in requests:
+                await x.cancel()
+
+    result: RunResultBase
+    token = load_listener.set(on_load)
+    try:
+        for i in range(retry.retries + 1):
+            m.attempts = i + 1
+            try:
+                result, deltas = await attempt()
+                break
+            except Exception as e:
+                if i == retry.retries or not transient(e):
+                    raise
+                delay = retry.backoff * 2**i * random.uniform(0.5, 1.5)
+                log().warning("%s: attempt %d failed, retry in %.3f seconds: %r", name, i + 1, delay, e)
+                stream_flush()
+                echo.retry()
+                m.ttft = 0
+                m.hedged, m.model, m.base_url = False, completion.model, completion.base_url
+                await asyncio.sleep(delay)
+    finally:
+        load_listener.reset(token)
+    final_output: str = result.final_output
+    m.latency = time.perf_counter() - start
+    m.ttft = m.ttft or m.latency
+    m.input_tokens = result.context_wrapper.usage.input_tokens
+    m.output_tokens = result.context_wrapper.usage.output_tokens
+    log().info("%s: completed in %.3f seconds (%s)", name, m.latency, m.mode)
+    if cache is not None:
+        cache.put(key, Response(output=final_output, deltas=deltas))
+    return final_output
+
+
+@dataclass
+class RollingSummary:
+    """Summary of the messages folded out of a context window, shared by the speakers of the same context."""
+
+    new_evaluator: Callable[[MainThread], "Evaluator[str]"]
+    covered: int = 0  # number of folded messages in the summary
+    content: str = ""
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)  # an update at a time
+
+    async def update(self, folded: list[ThreadMessage], step: int = 1) -> str:
+        """Fold the messages not yet summarized into the summary if step or more of them."""
+        async with self.lock:
+            if len(folded) - self.covered < step:
+                return self.content
+            messages = folded[self.covered :]
+            if self.content:
+                messages = [ThreadMessage(speaker=Builtin.moderator_name(), content=self.content), *messages]
+            log().debug("rolling summary: fold %d messages", len(folded) - self.covered)
+            thread = MainThread(messages=messages)  # type: ignore[no-untyped-call]
+            e = self.new_evaluator(thread)
+            self.content = e.conclude(await e.complete(quiet=True))
+            self.covered = len(folded)
+            return self.content
 
 
 @dataclass
@@ -56,36 +349,64 @@ class Bot:
     main_thread: MainThread
     speaker: Speaker
     model_provider: ModelProvider
+    context: Context = field(default_factory=Context)
+    summary: RollingSummary | None = None
+    completion: Completion = field(default_factory=Completion)
+    metric: Metric | None = field(default=None, init=False, repr=False)  # of the output not yet concluded
+    prompt: PromptBuilder = field(init=False, repr=False)
 
-    def __new_message(self, speaker: str, content: str) -> Message:
-        if self.speaker.name == speaker:
-            return Message.assistant(content)
-        return Message.user(content)
+    def __post_init__(self) -> None:
+        """Set up the prompt builder of the speaker."""
+        self.prompt = PromptBuilder(speaker=self.speaker.name)
 
     @property
     def __thread(self) -> Thread:
         return self.main_thread
 
-    @property
-    def __messages(self) -> list[Message]:
-        return [self.__new_message(x.speaker, x.into_str()) for x in self.__thread.messages]
-
-    async def reply(self) -> None:
-        """Append a reply to the main thread."""
+    async def __prompt(self) -> Prompt:
+        w = Window.select(self.__thread.messages, self.context)
+        if w.folded:
+            log().debug("%s: fold %d messages, keep %d tokens", self.speaker.name, len(w.folded), w.tokens)
+        sources = list(w.head)
+        if w.folded and self.summary is not None:
+            summary = await self.summary.update(w.folded, self.context.summary_step)
+            if summary:
+                sources.append(ThreadMessage(speaker=Builtin.moderator_name(), content=summary))
+            # not yet summarized
+            sources.extend(w.folded[self.summary.covered :])
+        sources.extend(w.tail)
+        return self.prompt.build(self.instructions, sources)
+
+    async def complete(self, quiet: bool = False) -> str:
+        """Return a reply without appending it to the main thread."""
         log().info("%s: begin reply", self.speaker.name)
-        agent = Agent(name="assistant", instructions=self.instructions)
-        messages = self.__messages
-        for i, x in enumerate(messages):
-            log().debug("input[%s][%d][%s]: %s", self.speaker.name, i, x.role, x.content)
-        result = Runner.run_streamed(
-            starting_agent=agent,
-            input=[x.into_item() for x in messages],
-            run_config=RunConfig(model_provider=self.model_provider),
+        metric = self.completion.new_metric("bot", self.speaker.name)
+        prompt = await self.__prompt()
+        final_output = await complete(
+            name=self.speaker.name,
+            agent=Agent(name="assistant", instructions=prompt.instructions),
+            messages=prompt.messages,
+            model_provider=self.model_provider,
+            completion=self.completion,
+            quiet=quiet,
+            metric=metric,
         )
-        await streaming(result)
-        final_output: str = result.final_output
-        self.main_thread.append(self.speaker.name, final_output)
+        self.metric = metric
         log().info("%s: end reply", self.speaker.name)
+        return final_output
+
+    def conclude(self, output: str) -> None:
+        """Append the output of complete to the main thread."""
+        start = time.perf_counter()
+        self.main_thread.append(self.speaker.name, output)
+        metric, self.metric = self.metric, None
+        if metric is not None:
+            metric.hook = time.perf_counter() - start
+            self.completion.record(metric)
+
+    async def reply(self) -> None:
+        """Append a reply to the main thread."""
+        self.conclude(await self.complete())
 
 
 @dataclass
@@ -95,15 +416,37 @@ class Human:
     main_thread: MainThread
     speaker: Speaker
     end: str
+    timeout: float = 0  # seconds to wait for the input, 0 means forever
+    default: str = ""  # content on timeout, empty means skip the turn
+    metrics: Metrics | None = None
 
     async def reply(self) -> None:
         """Append a reply to the main thread."""
         log().info("%s: begin reply (human)", self.speaker.name)
         log().info("%s: content(end=%s)> ", self.speaker.name, self.end)
-        content = "\n".join(read_user_input(self.end))
+        metric = Metric(kind="human", name=self.speaker.name, mode="human")
+        start = metric.start()
+        try:
+            content = "\n".join(await read_user_input_async(self.end, self.timeout))
+        except TimeoutError:
+            metric.mode = "timeout"
+            if not self.default:
+                log().warning("%s: input timed out after %s seconds, skip", self.speaker.name, self.timeout)
+                metric.latency = metric.ttft = time.perf_counter() - start
+                self.__record(metric)
+                return
+            log().warning("%s: input timed out after %s seconds, reply default", self.speaker.name, self.timeout)
+            content = self.default
+        metric.latency = metric.ttft = time.perf_counter() - start
         self.main_thread.append(self.speaker.name, content)
+        metric.hook = time.perf_counter() - start - metric.latency
+        self.__record(metric)
         log().info("%s: end reply (human)", self.speaker.name)
 
+    def __record(self, m: Metric) -> None:
+        if self.metrics is not None:
+            self.metrics.record(m)
+
 
 ET = TypeVar("ET")
 
@@ -120,6 +463,9 @@ class Evaluator(ABC, Generic[ET]):
     agenda: str
     heading: str
     desc: str
+    summary: RollingSummary | None = None  # if not empty, read the summary instead of the old messages
+    completion: Completion = field(default_factory=Completion)
+    metric: Metric | None = field(default=None, init=False, repr=False)  # of the output not yet concluded
 
     @abstractmethod
     def parse_output(self, output: str) -> ET: ...
@@ -130,31 +476,51 @@ class Evaluator(ABC, Generic[ET]):
             content=self.desc,
         ).describe()
 
+    @property
+    def __thread(self) -> list[ThreadMessage]:
+        if self.summary is None or not self.summary.content:
+            return self.main_thread.latest(self.latest_messages).messages
+        log().debug("evaluator[%s]: read summary of %d messages", self.name, self.summary.covered)
+        return [
+            ThreadMessage(speaker=Builtin.moderator_name(), content=self.summary.content),
+            *self.main_thread.messages[self.summary.covered :],
+        ]
+
     @property
     def __messages(self) -> list[Message]:
-        return [Message.user(x.into_str()) for x in self.main_thread.latest(self.latest_messages).messages]
+        return [Message.user(x.into_str()) for x in self.__thread]
 
-    async def evaluate(self) -> ET:
+    async def complete(self, quiet: bool = False) -> str:
+        """Return the raw output of the evaluation without calling the hook."""
         log().info("evaluator[%s]: begin", self.name)
-        agent = Agent(
-            name=f"evaluator[{self.name}]",
-            instructions=self.description(),
+        metric = self.completion.new_metric("evaluator", self.name)
+        final_output = await complete(
+            name=self.name,
+            agent=Agent(name=f"evaluator[{self.name}]", instructions=self.description()),
+            messages=self.__messages,
+            model_provider=self.model_provider,
+            completion=self.completion,
+            quiet=quiet,
+            metric=metric,
         )
-        messages = self.__messages
-        for i, x in enumerate(messages):
-            log().debug("input[%s][%d][%s]: %s", self.name, i, x.role, x.content)
-        result = Runner.run_streamed(
-            starting_agent=agent,
-            input=[x.into_item() for x in messages],
-            run_config=RunConfig(model_provider=self.model_provider),
-        )
-        await streaming(result)
-        final_output: str = result.final_output
-        ret = self.parse_output(final_output)
-        self.hook(ret)
+        self.metric = metric
         log().info("evaluator[%s]: end", self.name)
+        return final_output
+
+    def conclude(self, output: str) -> ET:
+        """Parse the output of complete and call the hook."""
+        start = time.perf_counter()
+        ret = self.parse_output(output)
+        self.hook(ret)
+        metric, self.metric = self.metric, None
+        if metric is not None:
+            metric.hook = time.perf_counter() - start
+            self.completion.record(metric)
         return ret
 
+    async def evaluate(self) -> ET:
+        return self.conclude(await self.complete())
+
 
 class RawEvaluator(Evaluator[str]):
     @override
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+from .data import meta, IntoDict, FromDict
+from .log import log
+
+
+@dataclass
+class Response(IntoDict, FromDict):
+    """Cached response."""
+
+    output: str = meta(desc="final output").field(str)
+    deltas: list[str] = meta(desc="streamed text deltas").field(list[str], default_factory=list)
+    created: float = meta(desc="unix time of creation").field(float, default=0.0)
+
+
+@dataclass
+class ResponseCache:
+    """On-disk response cache, least recently used entries are evicted."""
+
+    # the mtime of an entry file is its creation and the atime is its last use
+
+    dir: str
+    max_entries: int = 1000  # 0 means unlimited
+    ttl: float = 0  # seconds to live since the creation, 0 means forever
+    entries: int = field(default=-1, init=False, repr=False)  # approximate number of entries, -1 means unknown
+    evicted_at: float = field(default=0, init=False, repr=False)
+
+    @staticmethod
+    def key(model: str, instructions: str, items: list[Any]) -> str:
+        """Return the key of the request."""
+        content = json.dumps({"model": model, "instructions": instructions, "input": items}, sort_keys=True)
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def __path(self, key: str) -> str:
+        return os.path.join(self.dir, f"{key}.json")
+
+    def get(self, key: str) -> Response | None:
+        """Return the response if it exists and is not expired."""
+        p = self.__path(key)
+        try:
+            with open(p) as f:
+                r = Response.from_dict(json.load(f))
+        except FileNotFoundError:
+            return None
+        except Exception:
+            log().warning("cache: broken entry %s", key, exc_info=True)
+            return None
+        if self.__expired(r.created):
+            log().debug("cache: expired %s", key)
+            self.__remove(p)
+            return None
+        os.utime(p, (time.time(), r.created))  # mark as recently used
+        log().debug("cache: hit %s", key)
+        return r
+
+    def __expired(self, created: float) -> bool:
+        return self.ttl > 0 and time.time() - created > self.ttl
+
+    def put(self, key: str, r: Response) -> None:
+        """Store the response, evict old entries if the entries exceed max_entries or ttl passed since the last."""
+        os.makedirs(self.dir, exist_ok=True)
+        r.created = time.time()
+        p = self.__path(key)
+        existed = os.path.exists(p)
+        tmp = f"{p}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(r.into_dict(), f, ensure_ascii=False)
+        os.utime(tmp, (r.created, r.created))
+        os.replace(tmp, p)
+        log().debug("cache: put %s", key)
+        if self.entries >= 0 and not existed:
+            self.entries += 1
+        if self.__should_evict():
+            self.evict()
+
+    def __should_evict(self) -> bool:
+        if self.entries < 0:
+            return True
+        if self.max_entries > 0 and self.entries > self.max_entries:
+            return True
+        return self.ttl > 0 and time.time() - self.evicted_at > self.ttl
+
+    def evict(self) -> None:
+        """Remove expired entries, and least recently used entries down to 90% of max_entries if over it."""
+        entries = []
+        for x in os.scandir(self.dir):
+            if not x.name.endswith(".json"):
+                continue
+            st = x.stat()
+            if self.__expired(st.st_mtime):
+                self.__remove(x.path)
+                continue
+            entries.append((st.st_atime, x.path))
+        self.entries = len(entries)
+        self.evicted_at = time.time()
+        if self.max_entries <= 0 or len(entries) <= self.max_entries:
+            return
+        # leave room not to scan again on the next put
+        keep = self.max_entries - self.max_entries // 10
+        entries.sort()
+        for _, p in entries[: len(entries) - keep]:
+            self.__remove(p)
+        self.entries = keep
+
+    @staticmethod
+    def __remove(path: str) -> None:
+        log().debug("cache: evict %s", path)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -1,21 +1,30 @@
 """Entry point of CLI."""
 
 import argparse
+import asyncio
 import os
+import signal
 import sys
 import textwrap
+from typing import TYPE_CHECKING
 
-from .config import ConfigYaml, Config, Message
+from .cache import ResponseCache
+from .config import ConfigJsonl, ConfigYaml, Config, Message, Thread
 from .io import file_or, Writer
-from .log import debug, log, quiet, stream
-from .mtg import Meeting
+from .jsonl import dumps as jsonl_dumps
+from .log import debug, file_target, log, quiet, stdout_target, stream, stream_close, StreamSink, StreamTarget
+from .metrics import jsonl_listener, Metrics
 from .rule import Rule
 from .skeleton import Skeleton
 from .yamlx import dumps as yaml_dumps
 
+if TYPE_CHECKING:
+    # agents and openai are imported when a meeting starts, not to slow down -h, --skeleton and --instructions
+    from .mtg import Meeting
 
-async def main() -> int:
-    """Entry point of CLI."""
+
+def new_parser() -> argparse.ArgumentParser:
+    """Return the parser of the meeting options."""
     parser = argparse.ArgumentParser(
         formatter_class=argparse.RawDescriptionHelpFormatter,
         description="Discuss with multiple AIs",
@@ -31,6 +40,13 @@ async def main() -> int:
             # custom model provider
             python -m ai_roundtable.cli -c dual.yml -a "Can AI be a friend to humans?" \\
               -u "http://localhost:11434/v1" -m "gemma3"
+            # continue discussion in JSON Lines, convert between yaml and jsonl
+            python -m ai_roundtable.cli -c dual.yml -t thread.jsonl -o thread.jsonl
+            python -m ai_roundtable.cli convert thread.yml thread.jsonl
+            # merge threads of resumed meetings, drop the duplicated messages
+            python -m ai_roundtable.cli convert thread1.jsonl thread2.jsonl merged.jsonl --dedup
+            # run many meetings in a process, see batch -h
+            python -m ai_roundtable.cli batch jobs.yml -u "http://localhost:11434/v1" -m "gemma3"
 
             A speaker that system.name is "end" overrides the end evaluator that \\
             dicides whther to continue the discussion.
@@ -66,7 +82,28 @@ async def main() -> int:
     )
     parser.add_argument("-t", "--thread", type=str, action="store", help="thread file, - means stdin")
     parser.add_argument("-o", "--out", type=str, action="store", help="thread output, default: null")
+    parser.add_argument(
+        "--thread_format",
+        choices=["auto", "yaml", "jsonl"],
+        default="auto",
+        help="format of thread and thread output, auto means jsonl if the file ends with .jsonl, default: auto",
+    )
     parser.add_argument("--disable_stream", action="store_true", help="disable message streaming to stdout")
+    parser.add_argument(
+        "--stream_interval",
+        type=float,
+        action="store",
+        default=0.05,
+        help="seconds to coalesce streamed text before writing, 0 means every delta, default: 0.05",
+    )
+    parser.add_argument(
+        "--stream_size",
+        type=int,
+        action="store",
+        default=4096,
+        help="write streamed text if buffered characters reach this, 0 means unlimited, default: 4096",
+    )
+    parser.add_argument("--stream_out", type=str, action="store", help="also stream messages to this file")
     parser.add_argument(
         "-n", "--max_turns", type=int, action="store", default=16, help="maximum number of statements, default: 16"
     )
@@ -79,6 +116,12 @@ async def main() -> int:
         help="maximum number of statements to go back for evaluation, default: 5",
     )
     parser.add_argument("-e", "--eval_out", type=str, action="store", help="evaluation output, default: null")
+    parser.add_argument(
+        "--metrics_out",
+        type=str,
+        action="store",
+        help="metrics output in JSON Lines, timings and tokens of replies and evaluations, default: null",
+    )
     parser.add_argument(
         "-s",
         "--skip_eval",
@@ -87,9 +130,75 @@ async def main() -> int:
         default=0,
         help="turns skip evaluation, negative value means never evaluate, default: 0",
     )
+    parser.add_argument(
+        "--eval_mode",
+        choices=["serial", "parallel", "speculative"],
+        default="serial",
+        help=textwrap.dedent(
+            """\
+            serial: evaluate one by one.
+            parallel: run summary and other evaluators concurrently after the end evaluation.
+            speculative: parallel, and run summary concurrently with the end evaluation.
+            default: serial"""
+        ),
+    )
+    parser.add_argument(
+        "--eval_concurrency",
+        type=int,
+        action="store",
+        default=0,
+        help="maximum number of concurrent evaluations, 0 means unlimited, default: 0",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help=textwrap.dedent(
+            """\
+            generate the next statement during the end evaluation, discard it if the meeting ends.
+            the statement generated ahead is not streamed live, it is printed at once when its turn comes"""
+        ),
+    )
+    parser.add_argument(
+        "--round_mode",
+        choices=["serial", "panel"],
+        default="serial",
+        help=textwrap.dedent(
+            """\
+            serial: speakers reply one by one, each reads the previous statements.
+            panel: bots of a round reply to the same thread concurrently, appended in the speaker order.
+                   --pipeline is ignored.
+            default: serial"""
+        ),
+    )
+    parser.add_argument(
+        "--summary_interval",
+        type=int,
+        action="store",
+        default=0,
+        help=textwrap.dedent(
+            """\
+            turns to update the running summary of the thread in background,
+            the summary and other evaluators read the summary instead of old statements,
+            0 means never, default: 0"""
+        ),
+    )
     parser.add_argument(
         "--user_input_end", type=str, action="store", default="END", help="signal end of user input, default: END"
     )
+    parser.add_argument(
+        "--human_timeout",
+        type=float,
+        action="store",
+        default=0,
+        help="seconds to wait for the input of a human speaker, 0 means forever, default: 0",
+    )
+    parser.add_argument(
+        "--human_default",
+        type=str,
+        action="store",
+        default="",
+        help="reply of a human speaker on timeout, @file_name to specify a file, empty means skip the turn",
+    )
     parser.add_argument("--debug", action="store_true", help="enable debug log")
     parser.add_argument("--quiet", action="store_true", help="quiet log")
     parser.add_argument("--skeleton", choices=["minimal", "dual", "full"], help="display config skeleton")
@@ -103,66 +212,182 @@ async def main() -> int:
     parser.add_argument(
         "--api_key_env", action="store", type=str, default="", help="Name of environment variable of API key"
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "--max_connections",
+        action="store",
+        type=int,
+        default=100,
+        help="maximum number of connections per endpoint, default: 100",
+    )
+    parser.add_argument(
+        "--max_keepalive_connections",
+        action="store",
+        type=int,
+        default=20,
+        help="maximum number of idle keep-alive connections per endpoint, default: 20",
+    )
+    parser.add_argument(
+        "--keepalive_expiry",
+        action="store",
+        type=float,
+        default=30.0,
+        help="seconds to keep idle connections, default: 30.0",
+    )
+    parser.add_argument(
+        "--max_in_flight",
+        action="store",
+        type=int,
+        default=0,
+        help="maximum number of requests in flight per endpoint w/o limits in config, 0 means unlimited, default: 0",
+    )
+    parser.add_argument(
+        "--cache_dir",
+        action="store",
+        type=str,
+        default="",
+        help="directory of the response cache, same model, instructions and input replay the cached response",
+    )
+    parser.add_argument(
+        "--cache_max_entries",
+        action="store",
+        type=int,
+        default=1000,
+        help="maximum number of cached responses, least recently used ones are evicted, default: 1000",
+    )
+    parser.add_argument(
+        "--cache_ttl",
+        action="store",
+        type=float,
+        default=0,
+        help="seconds to keep cached responses, 0 means forever, default: 0",
+    )
+    parser.add_argument(
+        "--flush_messages",
+        action="store",
+        type=int,
+        default=1,
+        help="flush the outputs every n messages, 0 means only by --flush_interval or at exit, default: 1",
+    )
+    parser.add_argument(
+        "--flush_interval",
+        action="store",
+        type=float,
+        default=0,
+        help="flush the buffered outputs at most seconds after the last flush, 0 means never, default: 0",
+    )
+    parser.add_argument("--fsync", action="store_true", help="fsync the outputs on flush")
+    return parser
+
 
+def setup_log(args: argparse.Namespace) -> None:
+    """Set up the logger by the options."""
     if args.debug:
         debug()
     if args.quiet:
         quiet()
+    targets: list[StreamTarget] = []
     if not args.disable_stream:
-        stream()
+        targets.append(stdout_target)
+    if args.stream_out:
+        targets.append(file_target(args.stream_out))
+    if targets:
+        stream(StreamSink(targets=targets, flush_interval=args.stream_interval, flush_size=args.stream_size))
+    else:
+        stream_close()
 
-    log().debug("start ai-roundtable")
 
-    if args.skeleton:
-        match args.skeleton:
-            case "minimal":
-                print(Skeleton.minimal())
-            case "dual":
-                print(Skeleton.dual())
-            case "full":
-                print(Skeleton.full())
-        return 0
+def setup_clients(args: argparse.Namespace) -> None:
+    """Set up the process-wide clients by the options."""
+    from .provider import PoolLimits, set_max_in_flight, set_pool_limits
+
+    set_pool_limits(
+        PoolLimits(
+            max_connections=args.max_connections,
+            max_keepalive_connections=args.max_keepalive_connections,
+            keepalive_expiry=args.keepalive_expiry,
+        )
+    )
+    set_max_in_flight(args.max_in_flight)
+
+
+def thread_format(fmt: str, path: str | None) -> str:
+    """Return yaml or jsonl, auto means jsonl if path ends with .jsonl else yaml."""
+    if fmt != "auto":
+        return fmt
+    return "jsonl" if path is not None and path.endswith(".jsonl") else "yaml"
+
+
+def dumps_thread(fmt: str, messages: list[Message]) -> str:
+    """Serialize messages in the thread format."""
+    d = [x.into_dict() for x in messages]
+    if fmt == "jsonl":
+        return jsonl_dumps(d)
+    return yaml_dumps(d)
 
-    def config() -> Config:
-        with open(args.config) as f:
-            config = f.read()
-        thread = ""
-        match args.thread:
+
+def load_config(config_file: str, thread_file: str | None, fmt: str = "auto") -> Config:
+    """Read config and thread, thread_file - means stdin."""
+    with open(config_file) as f:
+        config = f.read()
+    return load_thread(config, thread_file, fmt)
+
+
+def load_thread(config: str, thread_file: str | None, fmt: str = "auto") -> Config:
+    """Read thread, thread_file - means stdin."""
+    if thread_format(fmt, thread_file) == "jsonl":
+        match thread_file:
             case "-":
-                thread = sys.stdin.read()
-            case None:
-                thread = ""
-            case v:
-                if os.path.isfile(v):
-                    with open(v) as f:
-                        thread = f.read()
-        return ConfigYaml(config=config, thread=thread).into_config()
-
-    def out_stream(dest: str | None) -> Writer:
-        if dest is None:
-            return Writer.null()
-        return Writer.new(dest)
-
-    c = config()
+                return ConfigJsonl(config=config, thread=sys.stdin).into_config()
+            case str(path) if os.path.isfile(path):
+                with open(path) as f:
+                    return ConfigJsonl(config=config, thread=f).into_config()
+            case _:
+                return ConfigJsonl(config=config, thread=[]).into_config()
+    thread = ""
+    match thread_file:
+        case "-":
+            thread = sys.stdin.read()
+        case None:
+            thread = ""
+        case v:
+            if os.path.isfile(v):
+                with open(v) as f:
+                    thread = f.read()
+    return ConfigYaml(config=config, thread=thread).into_config()
 
-    def read_agenda() -> str:
-        if args.agenda:
-            a: str = args.agenda
-            return file_or(a)
-        if args.instructions is not None:
-            return "DUMMY AGENDA"
-        if len(c.main_thread) == 0:
-            raise Exception("no agenda!")
-        return c.main_thread.messages[0].content
 
-    agenda = read_agenda()
-    out = out_stream(args.out)
-    eval_out = out_stream(args.eval_out)
+def out_stream(args: argparse.Namespace, dest: str | None) -> Writer:
+    """Return the writer to dest, null if dest is None."""
+    if dest is None:
+        return Writer.null()
+    return Writer.new(dest, flush_messages=args.flush_messages, flush_interval=args.flush_interval, fsync=args.fsync)
+
+
+def exit_on_sigterm() -> None:
+    """Exit on SIGTERM to close the outputs like SIGINT."""
+    signal.signal(signal.SIGTERM, lambda signum, _: sys.exit(128 + signum))
+
+
+def new_meeting(
+    args: argparse.Namespace,
+    c: Config,
+    agenda: str,
+    out: Writer,
+    eval_out: Writer,
+    metrics_out: Writer | None = None,
+    name: str = "",
+) -> "Meeting":
+    """Return a new meeting that writes the thread, the evaluations and the metrics into the outputs."""
+    from .mtg import Meeting
+
+    out_format = thread_format(args.thread_format, out.dest)
+    metrics = Metrics(meeting=name)
+    if metrics_out is not None:
+        metrics.listen(jsonl_listener(metrics_out.write))
 
     def message_append_hook(m: Message) -> None:
         log().info("message apppended id=%s", m.identity())
-        out.write(yaml_dumps([m.into_dict()]))
+        out.write(dumps_thread(out_format, [m]))
 
     def end_evaluator_hook(v: bool) -> None:
         log().info("end evaluation appended: %s", v)
@@ -181,6 +406,9 @@ async def main() -> int:
         model=args.model,
         max_turns=args.max_turns,
         end=args.user_input_end,
+        human_timeout=args.human_timeout,
+        human_default=file_or(args.human_default),
+        metrics=metrics,
         end_evaluator_hook=end_evaluator_hook,
         summary_evaluator_hook=summary_evaluator_hook,
         raw_evaluator_hook=raw_evaluator_hook,
@@ -190,22 +418,122 @@ async def main() -> int:
         latest_messages=args.eval_messages,
         base_url=args.base_url,
         api_key_env=args.api_key_env,
+        eval_mode=args.eval_mode,
+        eval_concurrency=args.eval_concurrency,
+        pipeline=args.pipeline,
+        round_mode=args.round_mode,
+        summary_interval=args.summary_interval,
+        cache=(
+            ResponseCache(dir=args.cache_dir, max_entries=args.cache_max_entries, ttl=args.cache_ttl)
+            if args.cache_dir
+            else None
+        ),
     )
     meeting.setup()
+    return meeting
+
+
+def convert(argv: list[str]) -> int:
+    """Convert a thread between yaml and jsonl, merge threads if many sources."""
+    parser = argparse.ArgumentParser(
+        prog="convert", description="Convert a thread between yaml and jsonl by the extensions, concatenate sources"
+    )
+    parser.add_argument("src", type=str, nargs="+", action="store", help="source thread files, - means stdin")
+    parser.add_argument("dest", type=str, action="store", help="destination thread file, - means stdout")
+    parser.add_argument("--src_format", choices=["auto", "yaml", "jsonl"], default="auto", help="default: auto")
+    parser.add_argument("--dest_format", choices=["auto", "yaml", "jsonl"], default="auto", help="default: auto")
+    parser.add_argument("--dedup", action="store_true", help="drop the duplicated messages, keep the first ones")
+    args = parser.parse_args(argv)
+
+    t = Thread()
+    for x in args.src:
+        messages = load_thread("{}", x, args.src_format).main_thread.messages
+        if args.dedup:
+            n = t.merge(messages)
+            log().info("convert: %s: %d messages, %d duplicated", x, len(messages), len(messages) - n)
+        else:
+            t.messages.extend(messages)
+    content = dumps_thread(thread_format(args.dest_format, args.dest), t.messages)
+    if content and not content.endswith("\n"):
+        content += "\n"  # jsonl ends without a newline
+    if args.dest == "-":
+        sys.stdout.write(content)
+        return 0
+    with open(args.dest, "w") as f:
+        f.write(content)
+    return 0
+
+
+async def main(argv: list[str] | None = None) -> int:
+    """Entry point of CLI."""
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["batch"]:
+        from .batch import main as batch_main
+
+        return await batch_main(argv[1:])
+    if argv[:1] == ["convert"]:
+        return convert(argv[1:])
+
+    args = new_parser().parse_args(argv)
+    setup_log(args)
+    log().debug("start ai-roundtable")
+
+    if args.skeleton:
+        match args.skeleton:
+            case "minimal":
+                print(Skeleton.minimal())
+            case "dual":
+                print(Skeleton.dual())
+            case "full":
+                print(Skeleton.full())
+        return 0
+
+    c = load_config(args.config, args.thread, args.thread_format)
+
+    def read_agenda() -> str:
+        if args.agenda:
+            a: str = args.agenda
+            return file_or(a)
+        if args.instructions is not None:
+            return "DUMMY AGENDA"
+        if len(c.main_thread) == 0:
+            raise Exception("no agenda!")
+        return c.main_thread.messages[0].content
+
+    agenda = read_agenda()
     if args.instructions is not None:
+        c.setup()
         print(
-            Rule(config=c)
-            .print_rules(speaker=c.speakers[args.instructions].name, language=args.language, agenda=agenda)
-            .describe()
+            Rule(config=c).instructions(
+                speaker=c.speakers[args.instructions].name, language=args.language, agenda=agenda
+            )
         )
         return 0
-    await meeting.start()
 
-    return 0
+    from .provider import close_clients
 
+    out = out_stream(args, args.out)
+    eval_out = out_stream(args, args.eval_out)
+    metrics_out = out_stream(args, args.metrics_out)
+
+    meeting = new_meeting(args, c, agenda, out, eval_out, metrics_out)
+    setup_clients(args)
+    exit_on_sigterm()
+    try:
+        await meeting.start()
+    finally:
+        out.close()
+        eval_out.close()
+        metrics_out.close()
+        await close_clients()
+
+    return 0
 
-if __name__ == "__main__":
-    import sys
-    import asyncio
 
+def run() -> None:
+    """Entry point of the installed script."""
     sys.exit(asyncio.run(main()))
+
+
+if __name__ == "__main__":
+    run()
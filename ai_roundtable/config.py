@@ -1,36 +1,111 @@
 import hashlib
 import os
-from dataclasses import dataclass
-from typing import Callable, cast
+import sys
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Self, TYPE_CHECKING, cast
 
-import yaml
-from agents import ModelProvider
-
-from .data import meta, IntoDict, FromDict, IdentityDict, Validator, Desc
-from .provider import Setting as ProviderSetting
+from .data import meta, Dict, IntoDict, FromDict, IdentityDict, Validator, Desc
+from .jsonl import dumps as jsonl_dumps, loads as jsonl_loads
+from .log import log
 from .slice import find
-from .yamlx import dumps as yaml_dumps
+from .yamlx import dumps as yaml_dumps, loads as yaml_loads
 
+if TYPE_CHECKING:
+    from agents import ModelProvider
 
-@dataclass
+
+@dataclass(slots=True)
 class Message(Validator, IntoDict, FromDict, Desc):
     """Message definition."""
 
     content: str = meta(desc="message content", validator=Validator.length()).field(str)
     speaker: str = meta(desc="message speaker", validator=Validator.length()).field(str)
+    identity_cache: tuple[str, str, str] | None = meta(
+        desc="speaker, content and identity", dict_conv=False, ignore_desc=True
+    ).field(tuple, default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        """Validate and intern the speaker, threads repeat a few speakers."""
+        Validator.__post_init__(self)
+        self.speaker = sys.intern(self.speaker)
 
     def identity(self) -> str:
-        return hashlib.sha256(f"{self.speaker}:{self.content}".encode()).hexdigest()
+        c = self.identity_cache
+        # valid while speaker and content are the same objects, the cache keeps them alive
+        if c is None or c[0] is not self.speaker or c[1] is not self.content:
+            c = (self.speaker, self.content, hashlib.sha256(f"{self.speaker}:{self.content}".encode()).hexdigest())
+            self.identity_cache = c
+        return c[2]
 
     def into_str(self) -> str:
         return f"{self.speaker}: {self.content}"
 
 
+@dataclass
+class IdentityIndex:
+    """Positions of messages by identity, follows the appends to the messages."""
+
+    messages: list[Message] | None = None  # indexed list
+    size: int = 0  # number of indexed messages
+    positions: dict[str, int] = field(default_factory=dict)  # identity to the first position
+
+    def sync(self, messages: list[Message]) -> dict[str, int]:
+        """Index the appended messages, rebuild if the list is replaced or shrunk."""
+        if messages is not self.messages or len(messages) < self.size:
+            self.messages = messages
+            self.size = 0
+            self.positions = {}
+        for i in range(self.size, len(messages)):
+            self.positions.setdefault(messages[i].identity(), i)
+        self.size = len(messages)
+        return self.positions
+
+    def add(self, messages: list[Message], m: Message) -> bool:
+        """Append m to messages if the identity is not indexed, return True if appended."""
+        positions = self.sync(messages)
+        if m.identity() in positions:
+            return False
+        positions[m.identity()] = len(messages)
+        messages.append(m)
+        self.size = len(messages)
+        return True
+
+
 @dataclass
 class Thread(Validator, IntoDict, FromDict):
     """Chat thread."""
 
     messages: list[Message] = meta(desc="list of messages").field(list[Message], default_factory=list)
+    identity_index: IdentityIndex = meta(desc="index of identities", dict_conv=False, ignore_desc=True).field(
+        IdentityIndex, default_factory=IdentityIndex, repr=False, compare=False
+    )
+
+    @property
+    def positions(self) -> dict[str, int]:
+        """Return the first positions of messages by identity."""
+        return self.identity_index.sync(self.messages)
+
+    def index(self, m: Message) -> int | None:
+        """Return the first position of the same message."""
+        return self.positions.get(m.identity())
+
+    def __contains__(self, m: Message) -> bool:
+        """Return True if the thread has the same message."""
+        return m.identity() in self.positions
+
+    def merge(self, messages: Iterable[Message]) -> int:
+        """Append the messages not in the thread, return the number of appended messages."""
+        n = 0
+        for x in messages:
+            if self.identity_index.add(self.messages, x):
+                n += 1
+        return n
+
+    def dedup(self) -> "Thread":
+        """Return the thread without the duplicated messages, keep the first ones."""
+        r = Thread()
+        r.merge(self.messages)
+        return r
 
     def select(self, pred: Callable[[Message], bool]) -> "Thread":
         return Thread(messages=[x for x in self.messages if pred(x)])
@@ -66,6 +141,73 @@ class MainThread(Thread):
         return self.messages.append(m)
 
 
+@dataclass
+class Context(Validator, IntoDict, FromDict):
+    """Context window of a speaker."""
+
+    max_tokens: int = meta(
+        desc="estimated token budget of input messages, 0 means unlimited", validator=Validator.ge(0)
+    ).field(int, default=0)
+    latest: int = meta(desc="number of latest messages to keep, 0 means all", validator=Validator.ge(0)).field(
+        int, default=0
+    )
+    keep_first: bool = meta(desc="if true, always keep the first message, the agenda").field(bool, default=True)
+    summary: bool = meta(desc="if true, fold the dropped messages into a rolling summary").field(bool, default=False)
+    summary_step: int = meta(
+        desc="number of dropped messages to fold into the summary at once, the others are kept until the next fold",
+        validator=Validator.ge(1),
+    ).field(int, default=4)
+    fold_step: int = meta(
+        desc="number of messages folded at once, larger keeps the prompt prefix unchanged for more turns",
+        validator=Validator.ge(1),
+    ).field(int, default=1)
+
+
+@dataclass
+class Limits(Validator, IntoDict, FromDict):
+    """Limits of the requests to the endpoint of a speaker, the speakers of an endpoint share the first limits."""
+
+    max_in_flight: int = meta(
+        desc="maximum number of requests in flight, 0 means --max_in_flight", validator=Validator.ge(0)
+    ).field(int, default=0)
+    rate: float = meta(desc="requests per second, 0 means unlimited", validator=Validator.ge(0)).field(
+        float, default=0.0
+    )
+    burst: int = meta(desc="requests allowed at once by rate", validator=Validator.ge(1)).field(int, default=1)
+    adaptive: bool = meta(
+        desc="if true, halve the requests in flight on 429 and 503 responses and widen them by one per window"
+    ).field(bool, default=False)
+
+    def is_default(self) -> bool:
+        return self == Limits()
+
+
+@dataclass
+class Retry(Validator, IntoDict, FromDict):
+    """Timeout, retries and hedging of the requests of a speaker."""
+
+    timeout: float = meta(
+        desc="seconds to wait for the first token and between tokens, the whole reply w/o stream, 0 means forever",
+        validator=Validator.ge(0),
+    ).field(float, default=0.0)
+    retries: int = meta(desc="number of retries after a failure or a timeout", validator=Validator.ge(0)).field(
+        int, default=0
+    )
+    backoff: float = meta(
+        desc="seconds to wait before the first retry, doubled per retry with jitter", validator=Validator.ge(0)
+    ).field(float, default=1.0)
+    hedge_after: float = meta(
+        desc="seconds to wait for the first token before sending the same request to the hedge, 0 means never",
+        validator=Validator.ge(0),
+    ).field(float, default=0.0)
+    hedge_base_url: str = meta(desc="base url of the hedge, empty means the same endpoint").field(str, default="")
+    hedge_model: str = meta(desc="model of the hedge, empty means the same model").field(str, default="")
+
+    def hedge_same(self) -> bool:
+        """Return True if the hedged requests go to the same endpoint and model."""
+        return self.hedge_after > 0 and not self.hedge_base_url and not self.hedge_model
+
+
 @dataclass
 class Speaker(Validator, IntoDict, FromDict):
     """Speaker definition."""
@@ -76,6 +218,15 @@ class Speaker(Validator, IntoDict, FromDict):
     model: str = meta(desc="speaker model").field(str, default="")
     base_url: str = meta(desc="base url of API").field(str, default="")
     api_key_env: str = meta(desc="name of envvar of API key").field(str, default="")
+    context: Context | None = meta(desc="context window, the keys set override the config context").field(
+        Context, default=None
+    )
+    limits: Limits | None = meta(
+        desc="limits of the requests to base_url, the keys set override the config limits"
+    ).field(Limits, default=None)
+    retry: Retry | None = meta(
+        desc="timeout, retries and hedging of the requests, the keys set override the config retry"
+    ).field(Retry, default=None)
 
     def identity(self) -> str:
         return self.name
@@ -85,17 +236,47 @@ class Speaker(Validator, IntoDict, FromDict):
             return self.model
         return model
 
-    def provider(self, model: str = "", base_url: str = "", api_key_env: str = "") -> ModelProvider:
+    def provider(
+        self, model: str = "", base_url: str = "", api_key_env: str = "", limits: Limits | None = None
+    ) -> "ModelProvider":
+        from .provider import RateLimits, Setting as ProviderSetting
+
+        x = limits or self.limits
         return ProviderSetting(
             model_name=self.model_or(model),
             base_url=self.base_url or base_url,
             api_key=os.getenv(self.api_key_env or api_key_env) or "",
+            limits=None if x is None or x.is_default() else RateLimits(**x.into_dict()),
         ).provider
 
 
 SpeakerDict = IdentityDict[Speaker]
 
 
+@dataclass
+class SpeakerIndex:
+    """Lookup tables of speakers."""
+
+    speaker_dict: SpeakerDict
+    end_evaluator: Speaker
+    summary_evaluator: Speaker
+    raw_evaluators: list[Speaker]
+    turn_order: list[Speaker]
+
+    @staticmethod
+    def new(speakers: list[Speaker], system: list[Speaker]) -> "SpeakerIndex":
+        d = SpeakerDict()
+        for s in speakers:
+            d.add(s)
+        return SpeakerIndex(
+            speaker_dict=d,
+            end_evaluator=find(system, lambda x: x.name == "end") or Speaker(name="end"),
+            summary_evaluator=find(system, lambda x: x.name == "summary") or Speaker(name="summary"),
+            raw_evaluators=[x for x in system if x.name not in {"end", "summary"}],
+            turn_order=list(speakers),
+        )
+
+
 class Builtin:
     """Provide builtin resources."""
 
@@ -115,32 +296,84 @@ class Config(IntoDict, FromDict):
     main_thread: MainThread = meta(desc="main thread").field(MainThread)
     speakers: list[Speaker] = meta(desc="speaker definitions").field(list[Speaker], default_factory=list)
     system: list[Speaker] = meta(desc="system definitions").field(list[Speaker], default_factory=list)
+    context: Context = meta(desc="default context window of speakers").field(Context, default_factory=Context)
+    limits: Limits = meta(desc="default limits of the requests of speakers").field(Limits, default_factory=Limits)
+    retry: Retry = meta(desc="default timeout, retries and hedging of speakers").field(Retry, default_factory=Retry)
+    speaker_index: SpeakerIndex | None = meta(desc="cache of speaker lookups", dict_conv=False, ignore_desc=True).field(
+        SpeakerIndex, default=None, init=False, repr=False, compare=False
+    )
+
+    @property
+    def index(self) -> SpeakerIndex:
+        """Return the lookup tables of speakers, built at the first lookup after setup or invalidate_index."""
+        if self.speaker_index is None:
+            self.speaker_index = SpeakerIndex.new(self.speakers, self.system)
+        return self.speaker_index
+
+    def invalidate_index(self) -> None:
+        """Rebuild the lookup tables at the next lookup, call after adding, removing or renaming speakers."""
+        self.speaker_index = None
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> Self:
+        """Convert from Dict, the keys set in a section of a speaker override the config section."""
+        d = dict(d)
+        for key in ["speakers", "system"]:
+            if isinstance(d.get(key), list):
+                d[key] = [cls.__override(d, x) for x in d[key]]
+        return super().from_dict(d)
+
+    @staticmethod
+    def __override(config: Dict, speaker: Any) -> Any:
+        if not isinstance(speaker, dict):
+            return speaker
+        r = dict(speaker)
+        for key in ["context", "limits", "retry"]:
+            base, x = config.get(key), speaker.get(key)
+            if isinstance(base, dict) and isinstance(x, dict):
+                r[key] = base | x
+        return r
+
+    def context_of(self, speaker: Speaker) -> Context:
+        return self.context if speaker.context is None else speaker.context
+
+    def limits_of(self, speaker: Speaker) -> Limits:
+        return self.limits if speaker.limits is None else speaker.limits
+
+    def retry_of(self, speaker: Speaker) -> Retry:
+        return self.retry if speaker.retry is None else speaker.retry
 
     @property
     def end_evaluator(self) -> Speaker:
-        return find(
-            self.system,
-            lambda x: x.name == "end",
-        ) or Speaker(name="end")
+        return self.index.end_evaluator
 
     @property
     def summary_evaluator(self) -> Speaker:
-        return find(
-            self.system,
-            lambda x: x.name == "summary",
-        ) or Speaker(name="summary")
+        return self.index.summary_evaluator
 
     @property
     def raw_evaluators(self) -> list[Speaker]:
-        return [x for x in self.system if x.name not in {"end", "summary"}]
+        return self.index.raw_evaluators
+
+    def speaker_of_turn(self, turn: int) -> Speaker:
+        """Return the speaker of the turn, the first turn is 1."""
+        order = self.index.turn_order
+        return order[(turn - 1) % len(order)]
 
     def setup(self) -> None:
+        self.invalidate_index()
         self.validate()
 
     def validate(self) -> None:
         self.speaker_dict
         self.__validate_main_thread()
         self.__validate_raw_evaluator()
+        self.__validate_retry()
+
+    def __validate_retry(self) -> None:
+        for x in self.speakers + self.system:
+            if self.retry_of(x).hedge_same():
+                log().warning("speaker %s hedges to the same endpoint and model, see hedge_base_url", x.name)
 
     def __validate_raw_evaluator(self) -> None:
         for x in self.raw_evaluators:
@@ -148,23 +381,20 @@ class Config(IntoDict, FromDict):
                 raise Exception(f"evaluator {x.name} has no desc")
 
     def __validate_main_thread(self) -> None:
+        sd = self.speaker_dict
         for x in self.main_thread.messages:
-            self.__validate_message(x)
+            self.__validate_message(sd, x)
 
-    def __validate_message(self, message: Message) -> None:
+    def __validate_message(self, sd: SpeakerDict, message: Message) -> None:
         if message.speaker == Builtin.moderator_name():
             # skip moderator
             return
-        sd = self.speaker_dict
         if message.speaker not in sd.elems:
             raise Exception(f"speaker {message.speaker} not found in message {message.identity()}")
 
     @property
     def speaker_dict(self) -> SpeakerDict:
-        d = SpeakerDict()
-        for s in self.speakers:
-            d.add(s)
-        return d
+        return self.index.speaker_dict
 
 
 @dataclass
@@ -175,8 +405,8 @@ class ConfigYaml:
     thread: str
 
     def into_config(self) -> Config:
-        c = yaml.safe_load(self.config)
-        t = yaml.safe_load(self.thread)
+        c = yaml_loads(self.config)
+        t = yaml_loads(self.thread)
         c["main_thread"] = {"messages": [] if t is None else t}
         return Config.from_dict(c)
 
@@ -189,3 +419,24 @@ class ConfigYaml:
             config=yaml_dumps(d),
             thread=yaml_dumps(t),
         )
+
+
+@dataclass
+class ConfigJsonl:
+    """Config as yaml and thread as JSON Lines, a message per line."""
+
+    config: str
+    thread: Iterable[str]  # lines, read lazily
+
+    def into_config(self) -> Config:
+        c = ConfigYaml(config=self.config, thread="").into_config()
+        c.main_thread.messages.extend(Message.from_dict(x) for x in jsonl_loads(self.thread))
+        return c
+
+    @staticmethod
+    def from_config(c: Config) -> "ConfigJsonl":
+        y = ConfigYaml.from_config(c)
+        return ConfigJsonl(
+            config=y.config,
+            thread=jsonl_dumps([x.into_dict() for x in c.main_thread.messages]).splitlines(),
+        )
@@ -1,6 +1,6 @@
 from abc import ABC
 from dataclasses import dataclass, is_dataclass, fields, Field, field, MISSING
-from types import GenericAlias
+from types import GenericAlias, UnionType
 from typing import Callable, Any, Optional, TypeVar, Self, Protocol, cast, Type
 
 from .desc import Section
@@ -14,120 +14,211 @@ ValidatorFunc = Callable[[Any], bool]
 Dict = dict[str, Any]
 
 
+Conv = Callable[[Any], Any]
+FromDictPlan = list[tuple[str, Callable[[], Any] | None, Conv]]  # name, default, converter
+IntoDictPlan = list[str]  # names
+ValidatorPlan = list[tuple[str, ValidatorFunc]]  # name, validator
+
+# builtin types that have neither from_dict_default nor into_dict
+_plain_types = frozenset([str, int, float, bool, type(None), list, dict, set, tuple])
+
+
+def _plan[T](cls: type, key: str, compile: Callable[[], T]) -> T:
+    """Return the plan of cls, compile it at the first call."""
+    plan = cls.__dict__.get(key)  # not inherited
+    if plan is None:
+        plan = compile()
+        setattr(cls, key, plan)
+    return cast(T, plan)
+
+
+def _meta_of(f: Field[Any], note: str) -> "Meta":
+    """Return the Meta of the field, raise MetaException if it does not exist."""
+    try:
+        meta = Meta.from_field(f)
+        if meta is None:
+            raise Exception("no Meta")
+        return meta
+    except Exception as e:
+        e.add_note(note)
+        raise MetaException from e
+
+
 class FromDict(ABC):
     """Conversion from Dict."""
 
+    __slots__ = ()  # allow slotted dataclasses
+
     @classmethod
     def from_dict_default(cls, name: str, value: Any) -> Any:
         """Override from_dict partially like json's default."""
         return value
 
+    @staticmethod
+    def __fail(msg: str) -> Conv:
+        def f(_: Any) -> Any:
+            raise Exception(msg)
+
+        return f
+
     @classmethod
-    def from_dict(cls: type[Self], d: Dict) -> Self:
-        """Convert from Dict."""
-        if not is_dataclass(cls):
-            raise MetaException("from_dict got not dataclass")
+    def __conv_of(cls, t: Any) -> Conv:
+        if hasattr(t, "from_dict"):
 
-        def from_dict_or(t: type, x: Any) -> Any:
-            if hasattr(t, "from_dict"):
+            def from_dict(x: Any) -> Any:
                 if not isinstance(x, dict):
                     raise Exception(f"want dict but got {x}")
                 return t.from_dict(x)
-            if t not in [int, float, str, bool]:
-                raise Exception(f"unsupported type: {t}")
+
+            return from_dict
+        if t not in [int, float, str, bool]:
+            return cls.__fail(f"unsupported type: {t}")
+        if t is float:
+
+            def to_float(x: Any) -> Any:
+                # yaml reads 2 as int
+                if isinstance(x, bool) or not isinstance(x, (int, float)):
+                    raise Exception(f"want {t} but got {x}")
+                return float(x)
+
+            return to_float
+
+        def check(x: Any) -> Any:
             if not isinstance(x, t):
                 raise Exception(f"want {t} but got {x}")
             return x
 
-        r = {}
+        return check
+
+    @classmethod
+    def __conv_of_field(cls, typ: Any) -> Conv:
+        if isinstance(typ, UnionType):
+            # like Context | None, None means unset
+            args = [x for x in typ.__args__ if x is not type(None)]
+            if len(args) != 1 or len(typ.__args__) != 2:
+                return cls.__fail(f"unsupported union type: {typ}")
+            opt = cls.__conv_of_field(args[0])
+            return lambda x: None if x is None else opt(x)
+        if not isinstance(typ, GenericAlias):
+            return cls.__conv_of(typ)
+        # like list[str]
+        origin = typ.__origin__
+
+        def generic(new: Callable[[Any], Any]) -> Conv:
+            def f(x: Any) -> Any:
+                if not isinstance(x, (list, set, tuple)):
+                    raise Exception(f"want origin type: {origin} but got {x}")
+                return new(x)
+
+            return f
+
+        if len(typ.__args__) != 1:
+            return cls.__fail(f"no generic type arg for {typ}")
+        conv = cls.__conv_of(typ.__args__[0])
+        match origin.__name__:
+            case "list":
+                return generic(lambda x: [conv(v) for v in x])
+            case "set":
+                return generic(lambda x: {conv(v) for v in x})
+            case "tuple":
+                return generic(lambda x: tuple(conv(v) for v in x))
+            case _:
+                return generic(cls.__fail(f"unsupported generic type: {origin}"))
+
+    @classmethod
+    def __compile_from_dict(cls) -> FromDictPlan:
+        if not is_dataclass(cls):
+            raise MetaException("from_dict got not dataclass")
+        r: FromDictPlan = []
         for f in fields(cls):
-            name = f.name
-            typ = f.type
-            value = d.get(name)
-            try:
-                meta = Meta.from_field(f)
-                if meta is None:
-                    raise Exception("no Meta")
-                if not meta.dict_conv:
-                    continue
+            meta = _meta_of(f, f"from_dict: field {f.name} of {cls.__name__}")
+            if not meta.dict_conv:
+                continue
+            default: Callable[[], Any] | None = None
+            if f.default is not MISSING:
+                default = (lambda v: lambda: v)(f.default)
+            elif f.default_factory is not MISSING:
+                default = f.default_factory
+            r.append((f.name, default, cls.__conv_of_field(f.type)))
+        return r
+
+    @classmethod
+    def from_dict(cls: type[Self], d: Dict) -> Self:
+        """Convert from Dict."""
+        plan = _plan(cls, "_from_dict_plan", cls.__compile_from_dict)
+        r = {}
+        name = ""
+        try:
+            for name, default, conv in plan:
+                value = d.get(name)
                 if value is None:
                     # set default value if exist
-                    if f.default != MISSING:
-                        value = f.default
-                    elif f.default_factory != MISSING:
-                        value = f.default_factory()
-                    else:
+                    if default is None:
                         raise Exception("value is None")
-
-                if hasattr(value, "from_dict_default"):
+                    value = default()
+                if type(value) not in _plain_types and hasattr(value, "from_dict_default"):
                     r[name] = value.from_dict_default(name, value)
-                    continue
-
-                match typ:
-                    case GenericAlias():  # like list[str]
-                        if len(typ.__args__) != 1:
-                            raise Exception(f"no generic type arg for {typ}")
-                        arg = typ.__args__[0]
-                        origin = typ.__origin__
-                        if not isinstance(value, (list, set, tuple)):
-                            raise Exception(f"want origin type: {origin} but got {value}")
-                        match origin.__name__:
-                            case "list":
-                                r[name] = [from_dict_or(arg, x) for x in value]
-                            case "set":
-                                r[name] = {from_dict_or(arg, x) for x in value}
-                            case "tuple":
-                                r[name] = tuple(from_dict_or(arg, x) for x in value)
-                            case _:
-                                raise Exception(f"unsupported generic type: {origin}")
-                    case _:
-                        r[name] = from_dict_or(typ, value)
-            except Exception as e:
-                e.add_note(f"from_dict: field {name} of {cls.__name__}")
-                raise MetaException from e
+                else:
+                    r[name] = conv(value)
+        except Exception as e:
+            e.add_note(f"from_dict: field {name} of {cls.__name__}")
+            raise MetaException from e
         return cls(**r)
 
 
+def _into_dict_or(v: Any) -> Any:
+    """Return v.into_dict() if exists else v."""
+    if type(v) in _plain_types:
+        return v
+    return v.into_dict() if hasattr(v, "into_dict") else v
+
+
 class IntoDict(ABC):
     """Conversion into Dict."""
 
-    def into_dict(self) -> Dict:
-        """Convert into Dict."""
-        if not is_dataclass(self):
-            raise MetaException("into_dict got not dataclass")
+    __slots__ = ()  # allow slotted dataclasses
 
-        def into_dict_or(v: Any) -> Any:
-            return v.into_dict() if hasattr(v, "into_dict") else v
+    @classmethod
+    def __compile_into_dict(cls) -> IntoDictPlan:
+        if not is_dataclass(cls):
+            raise MetaException("into_dict got not dataclass")
+        r: IntoDictPlan = []
+        for f in fields(cls):
+            meta = _meta_of(f, f"from into_dict: field {f.name} of class {cls.__name__}")
+            if meta.dict_conv:
+                r.append(f.name)
+        return r
 
+    def into_dict(self) -> Dict:
+        """Convert into Dict."""
+        plan = _plan(type(self), "_into_dict_plan", self.__compile_into_dict)
         r: dict[str, Any] = {}
-        for f in fields(self):
-            name = f.name
-            try:
-                meta = Meta.from_field(f)
-                if meta is None:
-                    raise Exception("no Meta")
-                if not meta.dict_conv:
-                    continue
+        name = ""
+        try:
+            for name in plan:
                 value = getattr(self, name)
-
                 match value:
+                    case None:
+                        pass  # unset
                     case list():
-                        r[name] = [into_dict_or(v) for v in value]
+                        r[name] = [_into_dict_or(v) for v in value]
                     case set():
-                        r[name] = {into_dict_or(v) for v in value}
+                        r[name] = {_into_dict_or(v) for v in value}
                     case tuple():
-                        r[name] = tuple(into_dict_or(v) for v in value)
+                        r[name] = tuple(_into_dict_or(v) for v in value)
                     case _:
-                        r[name] = into_dict_or(value)
-            except Exception as e:
-                e.add_note(f"from into_dict: field {name} of class {self.__class__.__name__}")
-                raise MetaException from e
+                        r[name] = _into_dict_or(value)
+        except Exception as e:
+            e.add_note(f"from into_dict: field {name} of class {self.__class__.__name__}")
+            raise MetaException from e
         return r
 
 
 class Desc(ABC):
     """Extract descriptions."""
 
+    __slots__ = ()  # allow slotted dataclasses
+
     @classmethod
     def describe(cls) -> Section:
         """Extract descriptions from fields."""
@@ -224,22 +315,31 @@ meta = Meta.new
 class Validator:
     """Validator for dataclass fields."""
 
+    __slots__ = ()  # allow slotted dataclasses
+
+    @classmethod
+    def __compile(cls) -> ValidatorPlan:
+        if not is_dataclass(cls):
+            raise MetaException("Validator got not dataclass")
+        r: ValidatorPlan = []
+        for f in fields(cls):
+            meta = _meta_of(f, f"from Validator: field {f.name} of class {cls.__name__}")
+            if meta.validator is not None:
+                r.append((f.name, meta.validator))
+        return r
+
     def __post_init__(self) -> None:
         """Dataclass's __post_init__."""
-        if not is_dataclass(self):
-            raise MetaException("Validator got not dataclass")
-        for f in fields(self):
-            name = f.name
-            try:
-                meta = Meta.from_field(f)
-                if meta is None:
-                    raise Exception("no Meta")
+        plan = _plan(type(self), "_validator_plan", self.__compile)
+        name = ""
+        try:
+            for name, validate in plan:
                 value = getattr(self, name)
-                if not meta.validate(value):
+                if not validate(value):
                     raise Exception(f"invalid value: {value}")
-            except Exception as e:
-                e.add_note(f"from Validator: field {name} of class {f.__class__.__name__}")
-                raise MetaException from e
+        except Exception as e:
+            e.add_note(f"from Validator: field {name} of class {self.__class__.__name__}")
+            raise MetaException from e
 
     @staticmethod
     def length(min_len: int = 1, max_len: int | None = None) -> ValidatorFunc:
@@ -1,13 +1,53 @@
+import asyncio
+import atexit
+import collections
+import os
+import queue
 import sys
+import threading
+import time
 import typing
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+
+__files: set[typing.TextIO] = set()
+
+
+def __close_files() -> None:
+    """Close the files that are still open at exit."""
+    global __files
+    for f in list(__files):
+        f.close()
+    __files.clear()
+
+
+atexit.register(__close_files)
+
+
+def _open_file(dest: str) -> typing.TextIO:
+    global __files
+    f = open(dest, "a")
+    __files.add(f)
+    return f
+
+
+def _close_file(f: typing.TextIO) -> None:
+    global __files
+    __files.discard(f)
+    f.close()
 
 
 @dataclass
 class Writer:
-    """Output stream."""
+    """Output stream, a file is opened at the first write and kept open until close."""
 
     dest: str
+    flush_messages: int = 1  # flush every n messages, 0 means only by interval or close
+    flush_interval: float = 0  # flush buffered messages seconds after the last flush, 0 means never
+    fsync: bool = False  # if true, fsync on flush
+    file: typing.TextIO | None = field(default=None, init=False, repr=False, compare=False)
+    pending: int = field(default=0, init=False, repr=False, compare=False)
+    flushed_at: float = field(default=0, init=False, repr=False, compare=False)
+    timer: asyncio.TimerHandle | None = field(default=None, init=False, repr=False, compare=False)
 
     @classmethod
     def null(cls) -> typing.Self:
@@ -22,8 +62,8 @@ class Writer:
         return cls(dest="stderr")
 
     @classmethod
-    def new(cls, dest: str) -> typing.Self:
-        return cls(dest=dest)
+    def new(cls, dest: str, flush_messages: int = 1, flush_interval: float = 0, fsync: bool = False) -> typing.Self:
+        return cls(dest=dest, flush_messages=flush_messages, flush_interval=flush_interval, fsync=fsync)
 
     def write(self, msg: str) -> None:
         """Write msg to dest."""
@@ -35,18 +75,124 @@ class Writer:
             case "stderr":
                 print(msg, file=sys.stderr, flush=True)
             case dest:
-                with open(dest, "a") as f:
-                    print(msg, file=f, flush=True)
+                if self.file is None:
+                    self.file = _open_file(dest)
+                    self.flushed_at = time.monotonic()
+                print(msg, file=self.file)
+                self.pending += 1
+                if self.__should_flush():
+                    self.flush()
+                elif self.timer is None and self.flush_interval > 0:
+                    self.__start_timer()
+
+    def __start_timer(self) -> None:
+        """Flush after flush_interval even if no write follows, if an event loop is running."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self.timer = loop.call_later(self.flushed_at + self.flush_interval - time.monotonic(), self.flush)
+
+    def __should_flush(self) -> bool:
+        if self.flush_messages > 0 and self.pending >= self.flush_messages:
+            return True
+        return self.flush_interval > 0 and time.monotonic() - self.flushed_at >= self.flush_interval
+
+    def flush(self) -> None:
+        """Flush the buffered messages, and fsync if enabled."""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.file is None:
+            return
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+        self.pending = 0
+        self.flushed_at = time.monotonic()
+
+    def close(self) -> None:
+        """Flush and close the file."""
+        if self.file is None:
+            return
+        self.flush()
+        _close_file(self.file)
+        self.file = None
+
+
+@dataclass
+class LineReader:
+    """Read lines in a daemon thread not to block the event loop."""
+
+    file: typing.TextIO
+    poll_interval: float = 0.05  # seconds to wait for the next line between polls
+    lines: queue.Queue[str | None] = field(default_factory=queue.Queue, init=False, repr=False)  # None means EOF
+    unread_lines: collections.deque[str] = field(default_factory=collections.deque, init=False, repr=False)
+    thread: threading.Thread | None = field(default=None, init=False, repr=False)
+
+    def __read(self) -> None:
+        for line in self.file:
+            self.lines.put(line.rstrip("\n"))
+        self.lines.put(None)
+
+    def start(self) -> None:
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.__read, name="line-reader", daemon=True)
+            self.thread.start()
+
+    async def readline(self, deadline: float = 0) -> str:
+        """Return a line, raise EOFError at the end and TimeoutError after deadline (time.monotonic) if not 0."""
+        self.start()
+        while True:
+            if self.unread_lines:
+                return self.unread_lines.popleft()
+            try:
+                # taken on the event loop, a cancelled reader never takes a line
+                line = self.lines.get_nowait()
+            except queue.Empty:
+                wait = self.poll_interval
+                if deadline > 0:
+                    wait = min(wait, deadline - time.monotonic())
+                    if wait <= 0:
+                        raise TimeoutError
+                await asyncio.sleep(wait)
+                continue
+            if line is None:
+                self.lines.put(None)  # for the next readers
+                raise EOFError
+            return line
+
+    def unread(self, lines: list[str]) -> None:
+        """Return the lines to be read first by the next readers."""
+        self.unread_lines.extendleft(reversed(lines))
+
+
+__stdin_reader: LineReader | None = None
+
+
+def stdin_reader() -> LineReader:
+    """Return the process-wide reader of stdin."""
+    global __stdin_reader
+    if __stdin_reader is None:
+        __stdin_reader = LineReader(file=sys.stdin)
+    return __stdin_reader
 
 
-def read_user_input(end: str) -> list[str]:
-    """Read user input line by line until reading end."""
+async def read_user_input_async(end: str, timeout: float = 0, reader: LineReader | None = None) -> list[str]:
+    """Read user input line by line until reading end, raise TimeoutError after timeout seconds if not 0."""
+    r = reader or stdin_reader()
+    deadline = time.monotonic() + timeout if timeout > 0 else 0
     lines: list[str] = []
-    while True:
-        line = input()
-        if line == end:
-            return lines
-        lines.append(line)
+    try:
+        while True:
+            line = await r.readline(deadline)
+            if line == end:
+                return lines
+            lines.append(line)
+    except BaseException:
+        # on timeout or cancel, the next read continues the input
+        r.unread(lines)
+        raise
 
 
 def file_or(v: str) -> str:
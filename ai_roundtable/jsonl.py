@@ -0,0 +1,14 @@
+import json
+from typing import Any, Iterable, Iterator
+
+
+def dumps(obj: list[Any]) -> str:
+    """Serialize obj as JSON Lines, an element per line."""
+    return "\n".join(json.dumps(x, ensure_ascii=False) for x in obj)
+
+
+def loads(lines: Iterable[str]) -> Iterator[Any]:
+    """Deserialize JSON Lines line by line, skip blank lines."""
+    for line in lines:
+        if line.strip():
+            yield json.loads(line)
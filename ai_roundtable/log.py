@@ -1,6 +1,10 @@
+import asyncio
+import atexit
 import logging
 import sys
-from typing import cast
+import time
+from dataclasses import dataclass, field
+from typing import Callable, TextIO, cast
 
 
 __debug: bool = False
@@ -53,15 +57,115 @@ def log() -> logging.Logger:
     return __get()
 
 
-__stream: bool = False
+StreamTarget = Callable[[str], None]
 
 
-def stream() -> None:
-    """Enable stream output."""
+def stdout_target(msg: str) -> None:
+    """Write msg to stdout."""
+    sys.stdout.write(msg)
+    sys.stdout.flush()
+
+
+def file_target(path: str) -> StreamTarget:
+    """Return the target that appends to the file, the file is opened at the first write."""
+    files: list[TextIO] = []
+
+    def write(msg: str) -> None:
+        if not files:
+            files.append(open(path, "a"))
+            atexit.register(files[0].close)
+        files[0].write(msg)
+        files[0].flush()
+
+    return write
+
+
+@dataclass
+class StreamSink:
+    """Coalesce streamed text and write it to the targets by time or size."""
+
+    targets: list[StreamTarget] = field(default_factory=lambda: [stdout_target])
+    flush_interval: float = 0.05  # flush if seconds passed since the last flush, 0 means every write
+    flush_size: int = 4096  # flush if buffered characters reach this, 0 means unlimited
+    buffer: list[str] = field(default_factory=list, init=False, repr=False)
+    size: int = field(default=0, init=False, repr=False)
+    flushed_at: float = field(default_factory=time.monotonic, init=False, repr=False)
+    timer: asyncio.TimerHandle | None = field(default=None, init=False, repr=False)
+
+    def write(self, msg: str) -> None:
+        self.buffer.append(msg)
+        self.size += len(msg)
+        if self.__should_flush():
+            self.flush()
+        elif self.timer is None:
+            self.__start_timer()
+
+    def __start_timer(self) -> None:
+        """Flush after flush_interval even if no write follows, if an event loop is running."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self.timer = loop.call_later(self.flushed_at + self.flush_interval - time.monotonic(), self.flush)
+
+    def __should_flush(self) -> bool:
+        if self.flush_size > 0 and self.size >= self.flush_size:
+            return True
+        return time.monotonic() - self.flushed_at >= self.flush_interval
+
+    def flush(self) -> None:
+        """Write the buffered text to the targets."""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        self.flushed_at = time.monotonic()
+        if not self.buffer:
+            return
+        msg = "".join(self.buffer)
+        self.buffer.clear()
+        self.size = 0
+        for t in self.targets:
+            t(msg)
+
+
+__stream: StreamSink | None = None
+
+
+def stream(sink: StreamSink | None = None) -> None:
+    """Enable stream output, default: coalesced stdout."""
+    global __stream
+    if __stream is not None:
+        __stream.flush()
+    __stream = sink or StreamSink()
+
+
+def stream_close() -> None:
+    """Flush and disable stream output."""
+    global __stream
+    if __stream is not None:
+        __stream.flush()
+    __stream = None
+
+
+def stream_enabled() -> bool:
+    """Return True if stream output is enabled."""
     global __stream
-    __stream = True
+    return __stream is not None
 
 
 def stream_log(msg: str) -> None:
-    """Print streaming log."""
-    print(msg, flush=True, end="")
+    """Write streaming log if stream output is enabled."""
+    global __stream
+    if __stream is None:
+        return
+    __stream.write(msg)
+
+
+def stream_flush() -> None:
+    """Flush streaming log."""
+    global __stream
+    if __stream is not None:
+        __stream.flush()
+
+
+atexit.register(stream_flush)
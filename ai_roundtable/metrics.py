@@ -0,0 +1,127 @@
+"""Timings of replies and evaluations."""
+
+import statistics
+import time
+from dataclasses import dataclass, field
+from typing import Callable
+
+from .data import meta, IntoDict
+from .jsonl import dumps as jsonl_dumps
+
+
+@dataclass
+class Metric(IntoDict):
+    """Timing of a reply or an evaluation."""
+
+    kind: str = meta(desc="bot, human or evaluator").field(str)
+    name: str = meta(desc="speaker or evaluator name").field(str)
+    meeting: str = meta(desc="meeting name, job name in batch").field(str, default="")
+    turn: int = meta(desc="turn of the meeting").field(int, default=0)
+    model: str = meta(desc="model name").field(str, default="")
+    base_url: str = meta(desc="endpoint, empty means the default").field(str, default="")
+    mode: str = meta(desc="streamed, run, cached, human, or timeout of human input").field(str, default="")
+    started: float = meta(desc="unix time of the start").field(float, default=0.0)
+    ttft: float = meta(desc="seconds to the first token").field(float, default=0.0)
+    latency: float = meta(desc="seconds to the final output").field(float, default=0.0)
+    hook: float = meta(desc="seconds spent in hooks and outputs").field(float, default=0.0)
+    input_tokens: int = meta(desc="number of input tokens").field(int, default=0)
+    output_tokens: int = meta(desc="number of output tokens").field(int, default=0)
+    in_flight: int = meta(desc="requests in flight to the endpoint when the request entered").field(int, default=0)
+    queued: int = meta(desc="requests waiting for the endpoint when the request entered").field(int, default=0)
+    attempts: int = meta(desc="number of attempts including retries").field(int, default=0)
+    hedged: bool = meta(desc="if true, the hedged request replied first").field(bool, default=False)
+
+    def start(self) -> float:
+        """Set started and return the perf_counter to measure from."""
+        self.started = time.time()
+        return time.perf_counter()
+
+
+@dataclass
+class MetricSummary(IntoDict):
+    """Summary of the metrics of a speaker or an evaluator."""
+
+    kind: str = meta(desc="bot, human or evaluator").field(str)
+    name: str = meta(desc="speaker or evaluator name").field(str)
+    model: str = meta(desc="model name").field(str)
+    count: int = meta(desc="number of metrics").field(int)
+    ttft: float = meta(desc="mean seconds to the first token").field(float)
+    latency: float = meta(desc="mean seconds to the final output").field(float)
+    latency_max: float = meta(desc="max seconds to the final output").field(float)
+    hook: float = meta(desc="total seconds spent in hooks and outputs").field(float)
+    input_tokens: int = meta(desc="total input tokens").field(int)
+    output_tokens: int = meta(desc="total output tokens").field(int)
+
+    @staticmethod
+    def new(ms: list[Metric]) -> "MetricSummary":
+        return MetricSummary(
+            kind=ms[0].kind,
+            name=ms[0].name,
+            model=ms[0].model,
+            count=len(ms),
+            ttft=round(statistics.mean(x.ttft for x in ms), 3),
+            latency=round(statistics.mean(x.latency for x in ms), 3),
+            latency_max=round(max(x.latency for x in ms), 3),
+            hook=round(sum(x.hook for x in ms), 3),
+            input_tokens=sum(x.input_tokens for x in ms),
+            output_tokens=sum(x.output_tokens for x in ms),
+        )
+
+
+MetricListener = Callable[[Metric], None]
+
+
+@dataclass
+class Metrics:
+    """Metrics of a meeting."""
+
+    meeting: str = ""
+    turn: int = 0  # current turn
+    records: list[Metric] = field(default_factory=list)
+    listeners: list[MetricListener] = field(default_factory=list)
+
+    def listen(self, f: MetricListener) -> None:
+        """Call f on every record."""
+        self.listeners.append(f)
+
+    def record(self, m: Metric) -> None:
+        m.meeting = self.meeting
+        m.turn = m.turn or self.turn
+        for k in ["ttft", "latency", "hook"]:
+            setattr(m, k, round(getattr(m, k), 6))
+        self.records.append(m)
+        for f in self.listeners:
+            f(m)
+
+    def summary(self) -> list[MetricSummary]:
+        """Return the summaries by kind, name and model, the slowest first."""
+        groups: dict[tuple[str, str, str], list[Metric]] = {}
+        for x in self.records:
+            groups.setdefault((x.kind, x.name, x.model), []).append(x)
+        return sorted((MetricSummary.new(x) for x in groups.values()), key=lambda x: x.latency, reverse=True)
+
+    def table(self) -> str:
+        """Return the summary as a table."""
+        header = ["kind", "name", "model", "count", "ttft", "latency", "max", "hook", "in", "out"]
+        rows = [header] + [
+            [
+                x.kind,
+                x.name,
+                x.model,
+                str(x.count),
+                f"{x.ttft:.3f}",
+                f"{x.latency:.3f}",
+                f"{x.latency_max:.3f}",
+                f"{x.hook:.3f}",
+                str(x.input_tokens),
+                str(x.output_tokens),
+            ]
+            for x in self.summary()
+        ]
+        widths = [max(len(r[i]) for r in rows) for i in range(len(header))]
+        return "\n".join("  ".join(c.ljust(w) for c, w in zip(r, widths)).rstrip() for r in rows)
+
+
+def jsonl_listener(write: Callable[[str], None]) -> MetricListener:
+    """Return the listener that writes a metric as a line of JSON."""
+    return lambda m: write(jsonl_dumps([m.into_dict()]))
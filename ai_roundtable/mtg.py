@@ -1,12 +1,27 @@
+import asyncio
 import textwrap
 import typing
-from dataclasses import dataclass
+from contextlib import suppress
+from dataclasses import dataclass, field, replace
 
 from agents import ModelProvider
 
-from .bot import Bot, Human, BotProto, EndEvaluator, SummaryEvaluator, Evaluator, RawEvaluator
-from .config import Config, Speaker
+from .bot import (
+    Bot,
+    Human,
+    BotProto,
+    Completion,
+    EndEvaluator,
+    SummaryEvaluator,
+    Evaluator,
+    RawEvaluator,
+    RollingSummary,
+    replay,
+)
+from .cache import ResponseCache
+from .config import Config, MainThread, Speaker
 from .log import log
+from .metrics import Metrics
 from .rule import Rule
 
 
@@ -25,6 +40,20 @@ class Meeting:
     latest_messages: int
     base_url: str
     api_key_env: str
+    eval_mode: str = "serial"  # serial, parallel or speculative
+    eval_concurrency: int = 0  # maximum number of concurrent evaluations, 0 means unlimited
+    pipeline: bool = False  # generate the next reply during the end evaluation
+    round_mode: str = "serial"  # serial, or panel to let the bots of a round reply to the same thread concurrently
+    summary_interval: int = 0  # turns to update the summary of the main thread, 0 means never
+    cache: ResponseCache | None = None
+    human_timeout: float = 0  # seconds to wait for human input, 0 means forever
+    human_default: str = ""  # human reply on timeout, empty means skip the turn
+    metrics: Metrics = field(default_factory=Metrics)
+    providers: dict[tuple[str, str, str], ModelProvider] = field(default_factory=dict, init=False, repr=False)
+    summaries: dict[str, RollingSummary] = field(default_factory=dict, init=False, repr=False)  # by context
+    thread_summary: RollingSummary | None = field(default=None, init=False, repr=False)
+    bots: dict[str, BotProto] = field(default_factory=dict, init=False, repr=False)
+    thread_summary_task: asyncio.Task[str] | None = field(default=None, init=False, repr=False)
 
     @property
     def config(self) -> Config:
@@ -34,20 +63,47 @@ class Meeting:
         self.config.setup()
 
     def __provider(self, speaker: Speaker) -> ModelProvider:
-        return speaker.provider(
-            model=self.model,
-            base_url=self.base_url,
-            api_key_env=self.api_key_env,
+        key = (speaker.model_or(self.model), speaker.base_url or self.base_url, speaker.api_key_env or self.api_key_env)
+        if key not in self.providers:
+            self.providers[key] = speaker.provider(
+                model=self.model,
+                base_url=self.base_url,
+                api_key_env=self.api_key_env,
+                limits=self.config.limits_of(speaker),
+            )
+        return self.providers[key]
+
+    def __completion(self, speaker: Speaker) -> Completion:
+        retry = self.config.retry_of(speaker)
+        c = Completion(
+            model=speaker.model_or(self.model),
+            cache=self.cache,
+            base_url=speaker.base_url or self.base_url,
+            metrics=self.metrics,
+            retry=retry,
         )
+        if retry.hedge_after > 0:
+            hedge = replace(
+                speaker,
+                base_url=retry.hedge_base_url or speaker.base_url,
+                model=retry.hedge_model or speaker.model,
+            )
+            c.hedge = self.__provider(hedge)
+            c.hedge_model = hedge.model_or(self.model)
+            c.hedge_base_url = hedge.base_url or self.base_url
+        return c
 
-    def __evaluator_params(self, speaker: Speaker, desc: str) -> dict[str, typing.Any]:
+    def __evaluator_params(
+        self, speaker: Speaker, desc: str, main_thread: MainThread | None = None
+    ) -> dict[str, typing.Any]:
         log().info("evaluator[%s]: %s", speaker.name, speaker.model_or(self.model))
         return {
             "name": speaker.name,
-            "main_thread": self.config.main_thread,
+            "main_thread": self.config.main_thread if main_thread is None else main_thread,
             "agenda": self.agenda,
-            "latest_messages": self.latest_messages,
+            "latest_messages": self.latest_messages if main_thread is None else len(main_thread),
             "model_provider": self.__provider(speaker),
+            "completion": self.__completion(speaker),
             "desc": speaker.desc or desc,
         }
 
@@ -75,27 +131,97 @@ class Meeting:
             ),
         )
 
-    @property
-    def __summary_evaluator(self) -> Evaluator[str]:
+    def __new_summary_evaluator(
+        self,
+        hook: typing.Callable[[str], None],
+        main_thread: MainThread | None = None,
+        summary: RollingSummary | None = None,
+    ) -> Evaluator[str]:
         return SummaryEvaluator(
-            hook=self.summary_evaluator_hook,
+            hook=hook,
             heading="Summary",
+            summary=summary,
             **self.__evaluator_params(
                 self.config.summary_evaluator,
                 desc=textwrap.dedent(
                     """\
                     Provide summary of input text concisely and comprehensively in {language}.""",
                 ).format(language=self.language),
+                main_thread=main_thread,
             ),
         )
 
+    @property
+    def __summary_evaluator(self) -> Evaluator[str]:
+        return self.__new_summary_evaluator(self.summary_evaluator_hook, summary=self.__thread_summary)
+
+    def __new_rolling_summary(self) -> RollingSummary:
+        def new_evaluator(main_thread: MainThread) -> Evaluator[str]:
+            return self.__new_summary_evaluator(lambda _: None, main_thread)
+
+        return RollingSummary(new_evaluator=new_evaluator)
+
+    def __rolling_summary(self, speaker: Speaker) -> RollingSummary | None:
+        context = self.config.context_of(speaker)
+        if not context.summary:
+            return None
+        # the speakers of the same context fold the same messages
+        key = repr(context)
+        if key not in self.summaries:
+            self.summaries[key] = self.__new_rolling_summary()
+        return self.summaries[key]
+
+    @property
+    def __thread_summary(self) -> RollingSummary | None:
+        if self.summary_interval <= 0:
+            return None
+        if self.thread_summary is None:
+            self.thread_summary = self.__new_rolling_summary()
+        return self.thread_summary
+
+    def __update_thread_summary(self, turn: int) -> None:
+        """Update the summary of the main thread in background."""
+        summary = self.__thread_summary
+        if summary is None or turn % self.summary_interval != 0:
+            return
+        task = self.thread_summary_task
+        if task is not None and not task.done():
+            log().debug("turn: %d, skip summary update because the previous one is running", turn)
+            return
+        if task is not None:
+            self.__check_thread_summary(task)
+        log().debug("turn: %d, update summary", turn)
+        self.thread_summary_task = asyncio.create_task(summary.update(list(self.config.main_thread.messages)))
+
+    @staticmethod
+    def __check_thread_summary(task: asyncio.Task[str]) -> None:
+        """Retrieve the result of the finished summary update, log the failure."""
+        if not task.cancelled() and task.exception() is not None:
+            log().warning("summary update failed: %r", task.exception())
+
+    async def __stop_thread_summary(self) -> None:
+        task = self.thread_summary_task
+        self.thread_summary_task = None
+        if task is None:
+            return
+        if task.done():
+            self.__check_thread_summary(task)
+            return
+        task.cancel()
+        with suppress(asyncio.CancelledError, Exception):
+            await task
+
+    def __raw_evaluator_hook(self, name: str) -> typing.Callable[[str], None]:
+        return lambda v: self.raw_evaluator_hook(name, v)
+
     @property
     def __raw_evaluators(self) -> list[Evaluator[str]]:
         RawEvaluator
         return [
             RawEvaluator(
-                hook=lambda v: self.raw_evaluator_hook(x.name, v),
+                hook=self.__raw_evaluator_hook(x.name),
                 heading="Evaluation",
+                summary=self.__thread_summary,
                 **self.__evaluator_params(x, x.desc),
             )
             for x in self.config.raw_evaluators
@@ -108,21 +234,32 @@ class Meeting:
                 main_thread=self.config.main_thread,
                 speaker=speaker,
                 end=self.end,
+                timeout=self.human_timeout,
+                default=self.human_default,
+                metrics=self.metrics,
             )
+        return self.__new_bot(speaker)
 
+    def __new_bot(self, speaker: Speaker) -> Bot:
         log().info("speaker[bot]: %s, %s", speaker.name, speaker.model_or(self.model))
         return Bot(
             main_thread=self.config.main_thread,
             speaker=speaker,
-            instructions=self.rule.print_rules(
-                speaker=speaker.name, language=self.language, agenda=self.agenda
-            ).describe(),
+            instructions=self.rule.instructions(speaker=speaker.name, language=self.language, agenda=self.agenda),
             model_provider=self.__provider(speaker),
+            context=self.config.context_of(speaker),
+            summary=self.__rolling_summary(speaker),
+            completion=self.__completion(speaker),
         )
 
+    def __bot(self, speaker: Speaker) -> BotProto:
+        """Return the bot of the speaker, the bot lives as long as the meeting."""
+        if speaker.name not in self.bots:
+            self.bots[speaker.name] = self.new_bot(speaker)
+        return self.bots[speaker.name]
+
     def __speaker(self, turn: int) -> Speaker:
-        index = (turn - 1) % len(self.config.speakers)
-        return self.config.speakers[index]
+        return self.config.speaker_of_turn(turn)
 
     def __skip(self, turn: int) -> bool:
         if self.skip_eval_turns < 0:
@@ -139,10 +276,29 @@ class Meeting:
             return True
         return False
 
-    async def __evaluate(self, turn: int) -> bool:
-        if self.__skip(turn):
-            return False
-        log().info("turn: %d, evaluate", turn)
+    def __limiter(self) -> asyncio.Semaphore | None:
+        if self.eval_concurrency <= 0:
+            return None
+        return asyncio.Semaphore(self.eval_concurrency)
+
+    @staticmethod
+    async def __limited[T](limiter: asyncio.Semaphore | None, aw: typing.Awaitable[T]) -> T:
+        if limiter is None:
+            return await aw
+        async with limiter:
+            return await aw
+
+    async def __complete_all(self, limiter: asyncio.Semaphore | None, evaluators: list[Evaluator[str]]) -> list[str]:
+        return await asyncio.gather(*[self.__limited(limiter, e.complete(quiet=True)) for e in evaluators])
+
+    @staticmethod
+    def __conclude_all(evaluators: list[Evaluator[str]], outputs: list[str]) -> None:
+        # print and call hooks in the serial order regardless of the completion order
+        for e, v in zip(evaluators, outputs):
+            replay(v)
+            e.conclude(v)
+
+    async def __evaluate_serial(self) -> bool:
         if not await self.__end_evaluator.evaluate():
             return False
         log().info("meeting end due to end evaluation")
@@ -151,12 +307,130 @@ class Meeting:
             await e.evaluate()
         return True
 
+    async def __evaluate_parallel(self) -> bool:
+        limiter = self.__limiter()
+        if not await self.__limited(limiter, self.__end_evaluator.evaluate()):
+            return False
+        log().info("meeting end due to end evaluation")
+        evaluators = [self.__summary_evaluator, *self.__raw_evaluators]
+        self.__conclude_all(evaluators, await self.__complete_all(limiter, evaluators))
+        return True
+
+    async def __evaluate_speculative(self) -> bool:
+        limiter = self.__limiter()
+        summary = self.__summary_evaluator
+        summary_task = asyncio.create_task(self.__limited(limiter, summary.complete(quiet=True)))
+        try:
+            end = await self.__limited(limiter, self.__end_evaluator.evaluate())
+        except BaseException:
+            summary_task.cancel()
+            raise
+        if not end:
+            log().debug("discard speculative summary")
+            summary_task.cancel()
+            with suppress(asyncio.CancelledError, Exception):
+                await summary_task
+            return False
+        log().info("meeting end due to end evaluation")
+        raws = self.__raw_evaluators
+        outputs = await asyncio.gather(summary_task, self.__complete_all(limiter, raws))
+        self.__conclude_all([summary, *raws], [outputs[0], *outputs[1]])
+        return True
+
+    async def __evaluate(self, turn: int) -> bool:
+        if self.__skip(turn):
+            return False
+        log().info("turn: %d, evaluate (%s)", turn, self.eval_mode)
+        match self.eval_mode:
+            case "parallel":
+                return await self.__evaluate_parallel()
+            case "speculative":
+                return await self.__evaluate_speculative()
+            case _:
+                return await self.__evaluate_serial()
+
+    def __ahead(self, turn: int) -> Bot | None:
+        """Return the bot of the next turn if it should reply during the evaluation of this turn."""
+        if not self.pipeline or turn >= self.max_turns or self.__skip(turn):
+            return None
+        b = self.__bot(self.__speaker(turn + 1))
+        if not isinstance(b, Bot):
+            return None
+        return b
+
     async def start(self) -> None:
         log().info("meeting start")
+        try:
+            if self.round_mode == "panel":
+                await self.__rounds()
+            else:
+                await self.__turns()
+        finally:
+            await self.__stop_thread_summary()
+            if self.metrics.records:
+                log().info("metrics:\n%s", self.metrics.table())
+
+    async def __turns(self) -> None:
+        ahead: tuple[Bot, asyncio.Task[str]] | None = None
         for turn in range(1, self.max_turns + 1):
             s = self.__speaker(turn)
             log().info("turn: %d, speaker: %s", turn, s.name)
-            await self.new_bot(s).reply()
-            if await self.__evaluate(turn):
+            self.metrics.turn = turn
+            if ahead is None:
+                await self.__bot(s).reply()
+            else:
+                ahead_bot, ahead_task = ahead
+                ahead = None
+                output = await ahead_task
+                replay(output)
+                ahead_bot.conclude(output)
+            self.__update_thread_summary(turn)
+
+            b = self.__ahead(turn)
+            if b is None:
+                if await self.__evaluate(turn):
+                    return
+                continue
+            log().debug("turn: %d, reply ahead: %s", turn, b.speaker.name)
+            task = asyncio.create_task(b.complete(quiet=True))
+            try:
+                end = await self.__evaluate(turn)
+            except BaseException:
+                task.cancel()
+                raise
+            if end:
+                log().debug("turn: %d, discard reply ahead: %s", turn, b.speaker.name)
+                task.cancel()
+                with suppress(asyncio.CancelledError, Exception):
+                    await task
+                return
+            ahead = (b, task)
+        log().info("meeting end due to max_turns: %d", self.max_turns)
+
+    async def __rounds(self) -> None:
+        n = len(self.config.speakers)
+        for first in range(1, self.max_turns + 1, n):
+            turns = list(range(first, min(first + n, self.max_turns + 1)))
+            log().info("turn: %d-%d, panel", turns[0], turns[-1])
+            bots = [self.__bot(self.__speaker(x)) for x in turns]
+            # every bot reads the thread before any reply of the round is appended
+            tasks = {i: asyncio.create_task(b.complete(quiet=True)) for i, b in enumerate(bots) if isinstance(b, Bot)}
+            try:
+                for i, (turn, b) in enumerate(zip(turns, bots)):
+                    log().info("turn: %d, speaker: %s", turn, self.__speaker(turn).name)
+                    self.metrics.turn = turn
+                    if isinstance(b, Bot):
+                        output = await tasks[i]
+                        replay(output)
+                        b.conclude(output)
+                    else:
+                        await b.reply()
+                    self.__update_thread_summary(turn)
+            except BaseException:
+                for t in tasks.values():
+                    t.cancel()
+                await asyncio.gather(*tasks.values(), return_exceptions=True)
+                raise
+            if await self.__evaluate(turns[-1]):
                 return
         log().info("meeting end due to max_turns: %d", self.max_turns)
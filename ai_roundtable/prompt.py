@@ -0,0 +1,94 @@
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, cast
+
+from .config import Message as ThreadMessage
+from .log import log
+
+if TYPE_CHECKING:
+    from agents import TResponseInputItem
+
+
+@dataclass
+class Message:
+    """Message to be sent to the Agent."""
+
+    role: str
+    content: str
+
+    @staticmethod
+    def user(content: str) -> "Message":
+        """Return a new user message."""
+        return Message(role="user", content=content)
+
+    @staticmethod
+    def assistant(content: str) -> "Message":
+        """Return a new assistant message."""
+        return Message(role="assistant", content=content)
+
+    def into_item(self) -> "TResponseInputItem":
+        """Convert into Agent input."""
+        return cast("TResponseInputItem", {"role": self.role, "content": self.content})
+
+    def size(self) -> int:
+        return len(self.role) + len(self.content)
+
+
+@dataclass
+class Prompt:
+    """Instructions and messages to be sent to the Agent."""
+
+    instructions: str
+    messages: list[Message]
+    sources: list[ThreadMessage]  # thread messages rendered into messages
+    reused: int = 0  # number of messages shared with the previous prompt
+    shared: int = 0  # size of the prefix shared with the previous prompt
+
+    def size(self) -> int:
+        return len(self.instructions) + sum(x.size() for x in self.messages)
+
+
+@dataclass
+class PromptBuilder:
+    """Assemble the prompts of a speaker, reuse the rendered prefix of the previous prompt to keep it byte-stable."""
+
+    speaker: str
+    previous: Prompt | None = field(default=None, repr=False)
+
+    def __new_message(self, x: ThreadMessage) -> Message:
+        if x.speaker == self.speaker:
+            return Message.assistant(x.into_str())
+        return Message.user(x.into_str())
+
+    def build(self, instructions: str, sources: list[ThreadMessage]) -> Prompt:
+        """Return the prompt of the sources, the own messages are assistant, the others are user."""
+        p = self.previous
+        if p is None or p.instructions != instructions:
+            p = Prompt(instructions=instructions, messages=[], sources=[])
+            shared = 0
+        else:
+            shared = len(instructions)
+        n = 0
+        for x, y in zip(p.sources, sources):
+            if not (x is y or x == y):
+                break
+            shared += p.messages[n].size()
+            n += 1
+        r = Prompt(
+            instructions=instructions,
+            messages=p.messages[:n] + [self.__new_message(x) for x in sources[n:]],
+            sources=list(sources),
+            reused=n,
+            shared=shared,
+        )
+        if self.previous is not None:
+            log().debug(
+                "%s: prompt prefix reuse %.1f%%, %d/%d messages, %d/%d characters",
+                self.speaker,
+                100 * shared / max(r.size(), 1),
+                n,
+                len(sources),
+                shared,
+                r.size(),
+            )
+        self.previous = r
+        return r
@@ -1,21 +1,280 @@
-from dataclasses import dataclass
+import asyncio
+import math
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field, replace
+from typing import Any, AsyncIterator, Awaitable, Callable
 
-from agents import ModelProvider, Model, OpenAIChatCompletionsModel, OpenAIProvider
-from openai import AsyncOpenAI
+import httpx
+from agents import ModelProvider, Model, ModelResponse, OpenAIChatCompletionsModel, OpenAIProvider
+from agents.items import TResponseStreamEvent
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 
 from .log import log
 
 
+@dataclass
+class PoolLimits:
+    """Connection pool limits of a client."""
+
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+
+    def into_limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+
+ClientKey = tuple[str, str]
+
+
+@dataclass
+class RateLimits:
+    """Limits of the requests to an endpoint."""
+
+    max_in_flight: int = 0  # maximum number of requests in flight, 0 means unlimited
+    rate: float = 0.0  # requests per second, 0 means unlimited
+    burst: int = 1  # requests allowed at once by the rate
+    adaptive: bool = False  # adapt the requests in flight to 429 and 503 responses, AIMD
+
+
+# responses telling the endpoint is overloaded
+overloaded_status = frozenset([429, 503])
+
+# called with the requests in flight and waiting when a request of the context enters a limiter
+load_listener: ContextVar[Callable[[int, int], None] | None] = ContextVar("load_listener", default=None)
+
+
+@dataclass
+class EndpointLimiter:
+    """Token bucket and max in flight limiter of an endpoint, shared by its speakers."""
+
+    base_url: str
+    limits: RateLimits = field(default_factory=RateLimits)
+    in_flight: int = 0
+    queued: int = 0  # requests waiting for a slot or a token
+    overloaded: int = 0  # number of 429 and 503 responses
+    window: float = field(default=math.inf, init=False)  # current max in flight
+    responses: float = field(default=math.inf, init=False)  # since the last decrease of the window, inf means never
+    tokens: float = field(default=0.0, init=False)
+    refilled: float = field(default=0.0, init=False)
+    changed: asyncio.Condition = field(default_factory=asyncio.Condition, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        """Fill the bucket and open the window."""
+        if self.limits.max_in_flight > 0:
+            self.window = float(self.limits.max_in_flight)
+        self.tokens = float(self.limits.burst)
+        self.refilled = time.monotonic()
+
+    def __take_token(self) -> float:
+        """Take a token, return the seconds to the next token if the bucket is empty."""
+        if self.limits.rate <= 0:
+            return 0
+        now = time.monotonic()
+        self.tokens = min(float(self.limits.burst), self.tokens + (now - self.refilled) * self.limits.rate)
+        self.refilled = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.limits.rate
+
+    async def acquire(self) -> None:
+        f = load_listener.get()
+        if f is not None:
+            f(self.in_flight, self.queued)
+        self.queued += 1
+        try:
+            async with self.changed:
+                await self.changed.wait_for(lambda: self.in_flight < self.window)
+                self.in_flight += 1
+            try:
+                while (wait := self.__take_token()) > 0:
+                    await asyncio.sleep(wait)
+            except BaseException:
+                await self.release()
+                raise
+        finally:
+            self.queued -= 1
+
+    async def release(self) -> None:
+        async with self.changed:
+            self.in_flight -= 1
+            self.changed.notify_all()
+
+    async def observe(self, status: int) -> None:
+        """Adapt the window to the response status, halve it on overload and widen it by one per window."""
+        overloaded = status in overloaded_status
+        if overloaded:
+            self.overloaded += 1
+        if not self.limits.adaptive:
+            return
+        async with self.changed:
+            self.responses += 1
+            if overloaded:
+                # at most once per window of responses, the others were sent before the decrease
+                if self.responses < self.window:
+                    return
+                window = max(1.0, min(self.window, self.in_flight) / 2)
+                log().warning(
+                    "limiter[%s]: overloaded (%d), max in flight %.1f -> %.1f",
+                    self.base_url or "default",
+                    status,
+                    self.window,
+                    window,
+                )
+                self.window = window
+                self.responses = 0
+                return
+            if status < 400 and self.window != math.inf:
+                ceiling = self.limits.max_in_flight or math.inf
+                self.window = min(ceiling, self.window + 1 / self.window)
+                self.changed.notify_all()
+
+
+class LimitedModel(Model):
+    """Model that limits the requests to the endpoint."""
+
+    def __init__(self, model: Model, limiter: EndpointLimiter):
+        self.model = model
+        self.limiter = limiter
+
+    async def get_response(self, *args: Any, **kwargs: Any) -> ModelResponse:
+        await self.limiter.acquire()
+        try:
+            return await self.model.get_response(*args, **kwargs)
+        finally:
+            await self.limiter.release()
+
+    def stream_response(self, *args: Any, **kwargs: Any) -> AsyncIterator[TResponseStreamEvent]:
+        async def stream() -> AsyncIterator[TResponseStreamEvent]:
+            await self.limiter.acquire()
+            try:
+                async for x in self.model.stream_response(*args, **kwargs):
+                    yield x
+            finally:
+                await self.limiter.release()
+
+        return stream()
+
+
+class LimitedModelProvider(ModelProvider):
+    """Provider of LimitedModel."""
+
+    def __init__(self, provider: ModelProvider, limiter: EndpointLimiter):
+        self.provider = provider
+        self.limiter = limiter
+
+    def get_model(self, model_name: str | None) -> Model:
+        return LimitedModel(self.provider.get_model(model_name), self.limiter)
+
+
+@dataclass
+class ClientRegistry:
+    """Pooled clients keyed by (base_url, api_key)."""
+
+    limits: PoolLimits = field(default_factory=PoolLimits)
+    clients: dict[ClientKey, AsyncOpenAI] = field(default_factory=dict)
+    max_in_flight: int = 0  # maximum number of requests in flight per endpoint without limits, 0 means unlimited
+    limiters: dict[str, EndpointLimiter] = field(default_factory=dict)
+
+    def get(self, base_url: str, api_key: str) -> AsyncOpenAI:
+        """Return the client for the endpoint, create it if not exist."""
+        key = (base_url, api_key)
+        if key not in self.clients:
+            log().debug("client: new, base_url=%s", base_url or "default")
+            self.clients[key] = AsyncOpenAI(
+                base_url=base_url or None,
+                api_key=api_key or None,
+                http_client=DefaultAsyncHttpxClient(
+                    limits=self.limits.into_limits(),
+                    event_hooks={"response": [self.__observer(base_url)]},
+                ),
+            )
+        return self.clients[key]
+
+    def __observer(self, base_url: str) -> Callable[[httpx.Response], Awaitable[None]]:
+        # every response including the retried ones
+        async def observe(r: httpx.Response) -> None:
+            limiter = self.limiters.get(base_url)
+            if limiter is not None:
+                await limiter.observe(r.status_code)
+
+        return observe
+
+    def limiter(self, base_url: str, limits: RateLimits | None = None) -> EndpointLimiter:
+        """Return the limiter of the endpoint, create it by limits if not exist."""
+        if base_url not in self.limiters:
+            x = limits or RateLimits()
+            if x.max_in_flight <= 0:
+                x = replace(x, max_in_flight=self.max_in_flight)
+            log().debug("limiter[%s]: %s", base_url or "default", x)
+            self.limiters[base_url] = EndpointLimiter(base_url=base_url, limits=x)
+        elif limits is not None and limits != self.limiters[base_url].limits:
+            log().debug("limiter[%s]: ignore %s, the first limits win", base_url or "default", limits)
+        return self.limiters[base_url]
+
+    def limit(self, base_url: str, provider: ModelProvider, limits: RateLimits | None = None) -> ModelProvider:
+        """Limit the requests of the provider per endpoint."""
+        return LimitedModelProvider(provider, self.limiter(base_url, limits))
+
+    async def aclose(self) -> None:
+        """Close all clients and their connection pools."""
+        for x in self.limiters.values():
+            if x.overloaded > 0:
+                log().info("limiter[%s]: %d overloaded responses", x.base_url or "default", x.overloaded)
+        self.limiters.clear()
+        clients = list(self.clients.values())
+        self.clients.clear()
+        for c in clients:
+            await c.close()
+
+    def __len__(self) -> int:
+        """Return the number of clients."""
+        return len(self.clients)
+
+
+__registry: ClientRegistry | None = None
+
+
+def clients() -> ClientRegistry:
+    """Return the process-wide client registry."""
+    global __registry
+    if __registry is None:
+        __registry = ClientRegistry()
+    return __registry
+
+
+def set_pool_limits(limits: PoolLimits) -> None:
+    """Set the connection pool limits of the clients created after this call."""
+    clients().limits = limits
+
+
+def set_max_in_flight(n: int) -> None:
+    """Set the maximum number of requests in flight per endpoint."""
+    clients().max_in_flight = n
+
+
+async def close_clients() -> None:
+    """Close the process-wide clients."""
+    await clients().aclose()
+
+
 @dataclass
 class Setting:
     model_name: str
     api_key: str
     base_url: str | None = None
+    limits: RateLimits | None = None
 
     @property
     def client(self) -> AsyncOpenAI:
-        return AsyncOpenAI(
-            base_url=self.base_url,
+        return clients().get(
+            base_url=self.base_url or "",
             api_key=self.api_key or "dummy",
         )
 
@@ -23,9 +282,11 @@ class Setting:
     def provider(self) -> ModelProvider:
         if self.base_url in [None, ""]:
             log().debug("model[%s]: provider=openai", self.model_name)
-            return OpenAIProvider()
+            return clients().limit(
+                "", OpenAIProvider(openai_client=clients().get(base_url="", api_key=self.api_key)), self.limits
+            )
         log().debug("model[%s]: provider=custom, base_url=%s", self.model_name, self.base_url)
-        return CustomModelProvider(self)
+        return clients().limit(self.base_url or "", CustomModelProvider(self), self.limits)
 
 
 class CustomModelProvider(OpenAIProvider):
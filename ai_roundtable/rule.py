@@ -1,5 +1,5 @@
 import textwrap
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 from .config import Config
 from .desc import Section
@@ -8,6 +8,14 @@ from .desc import Section
 @dataclass
 class Rule:
     config: Config
+    rendered: dict[tuple[str, str, str], str] = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    def instructions(self, speaker: str, language: str, agenda: str) -> str:
+        """Return the rendered rules, rendered once per (speaker, language, agenda)."""
+        key = (speaker, language, agenda)
+        if key not in self.rendered:
+            self.rendered[key] = self.print_rules(speaker=speaker, language=language, agenda=agenda).describe()
+        return self.rendered[key]
 
     def print_rules(self, speaker: str, language: str, agenda: str) -> Section:
         return Section(
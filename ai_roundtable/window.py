@@ -0,0 +1,44 @@
+from dataclasses import dataclass, field
+
+from .config import Context, Message
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens of text, about 4 characters per token."""
+    return len(text) // 4 + 1
+
+
+@dataclass
+class Window:
+    """Messages split by a context window."""
+
+    head: list[Message] = field(default_factory=list)  # kept first messages
+    folded: list[Message] = field(default_factory=list)  # messages out of the window
+    tail: list[Message] = field(default_factory=list)  # kept latest messages
+
+    @property
+    def tokens(self) -> int:
+        return sum(estimate_tokens(x.into_str()) for x in self.head + self.tail)
+
+    @staticmethod
+    def select(messages: list[Message], context: Context) -> "Window":
+        """Split messages into head, folded and tail by context."""
+        w = Window(tail=list(messages))
+        if context.keep_first and w.tail:
+            w.head = w.tail[:1]
+            w.tail = w.tail[1:]
+        n = 0  # number of messages to fold
+        if context.latest > 0:
+            n = max(len(w.tail) - context.latest, 0)
+        if context.max_tokens > 0:
+            tokens = w.tokens - sum(estimate_tokens(x.into_str()) for x in w.tail[:n])
+            # keep the last message at least
+            while tokens > context.max_tokens and n < len(w.tail) - 1:
+                tokens -= estimate_tokens(w.tail[n].into_str())
+                n += 1
+        if n > 0 and context.fold_step > 1:
+            # fold by steps, the messages after the fold stay at the same positions until the next step
+            n = min(-(-n // context.fold_step) * context.fold_step, len(w.tail) - 1)
+        w.folded = w.tail[:n]
+        w.tail = w.tail[n:]
+        return w
@@ -1,27 +1,75 @@
+import re
 from typing import Any
 
 import yaml
+from yaml.representer import SafeRepresenter
 
+try:
+    from yaml import CSafeLoader as SafeLoader, CDumper as Dumper
 
-def __literal_string_representer(dumper: yaml.Dumper, data: str) -> yaml.ScalarNode:
+    libyaml = True
+except ImportError:  # pragma: no cover
+    from yaml import SafeLoader, Dumper  # type: ignore[assignment]
+
+    libyaml = False
+
+
+def __literal_string_representer(dumper: SafeRepresenter, data: str) -> yaml.ScalarNode:
     if "\n" in data:
         return dumper.represent_scalar("tag:yaml.org,2002:str", data, style="|")
     return dumper.represent_scalar("tag:yaml.org,2002:str", data)
 
 
-def __list_set_representer(dumper: yaml.Dumper, data: set[str]) -> yaml.SequenceNode:
+def __list_set_representer(dumper: SafeRepresenter, data: set[str]) -> yaml.SequenceNode:
     return dumper.represent_list(list(data))
 
 
-def __list_tuple_representer(dumper: yaml.Dumper, data: tuple[str]) -> yaml.SequenceNode:
+def __list_tuple_representer(dumper: SafeRepresenter, data: tuple[str]) -> yaml.SequenceNode:
     return dumper.represent_list(list(data))
 
 
-yaml.add_representer(str, __literal_string_representer)
-yaml.add_representer(set, __list_set_representer)
-yaml.add_representer(tuple, __list_tuple_representer)
+# representers are per class, register them to both the pure python and the libyaml dumpers
+for __dumper in [yaml.Dumper, Dumper]:
+    __dumper.add_representer(str, __literal_string_representer)
+    __dumper.add_representer(set, __list_set_representer)
+    __dumper.add_representer(tuple, __list_tuple_representer)
+
+
+# libyaml escapes the characters out of BMP, breaks lines at U+2028 and U+2029 and wraps double-quoted scalars
+# differently from the pure python emitter, objects containing such strings are dumped by the pure python emitter
+# to keep the output identical
+__unsafe_chars = re.compile("[^\n\x20-\x7e\xa0-\u2027\u202a-\ud7ff\ue000-\ufefe\uff00-\ufffd]| \n")
+
+
+def __is_safe_str(data: str) -> bool:
+    if __unsafe_chars.search(data):
+        return False
+    if "\n" not in data:
+        return True
+    # trailing spaces disallow literal style, trailing line breaks make libyaml end the document with "..."
+    return not (data.endswith(" ") or data.endswith("\n\n") or data == "\n")
+
+
+def __is_safe(obj: Any) -> bool:
+    match obj:
+        case str():
+            return __is_safe_str(obj)
+        case None | bool() | int() | float():
+            return True
+        case dict():
+            return all(__is_safe(k) and __is_safe(v) for k, v in obj.items())
+        case list() | tuple() | set():
+            return all(__is_safe(x) for x in obj)
+        case _:
+            return False
+
+
+def dumps(obj: Any, pure: bool = False) -> str:
+    """Serialize obj as yaml, use libyaml if available and the output is the same unless pure."""
+    dumper = Dumper if libyaml and not pure and __is_safe(obj) else yaml.Dumper
+    return yaml.dump(obj, Dumper=dumper, default_flow_style=False, allow_unicode=True)
 
 
-def dumps(obj: Any) -> str:
-    """Serialize obj as yaml."""
-    return yaml.dump(obj, default_flow_style=False, allow_unicode=True)
+def loads(s: str, pure: bool = False) -> Any:
+    """Deserialize yaml safely, use libyaml if available unless pure."""
+    return yaml.load(s, Loader=yaml.SafeLoader if pure else SafeLoader)
@@ -0,0 +1 @@
+"""Benchmarks for ai_roundtable."""
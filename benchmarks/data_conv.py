@@ -0,0 +1,53 @@
+"""Measure the conversions of data classes on large threads."""
+
+import argparse
+import json
+import statistics
+import time
+from typing import Callable
+
+from ai_roundtable.config import Config, Message, MainThread
+
+
+def measure(f: Callable[[], object], repeat: int) -> float:
+    r = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        r.append(time.perf_counter() - start)
+    return statistics.median(r)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure the conversions of data classes on large threads")
+    parser.add_argument("-n", "--messages", type=int, default=10000)
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    ds = [{"speaker": f"speaker{i % 4}", "content": f"content {i}"} for i in range(args.messages)]
+    ms = [Message.from_dict(x) for x in ds]
+    c = {"speakers": [], "main_thread": {"messages": ds}}
+    cases: dict[str, Callable[[], object]] = {
+        "new": lambda: [Message(speaker=x["speaker"], content=x["content"]) for x in ds],
+        "from_dict": lambda: [Message.from_dict(x) for x in ds],
+        "into_dict": lambda: [x.into_dict() for x in ms],
+        "config_from_dict": lambda: Config.from_dict(c),
+        "config_into_dict": lambda: Config(speakers=[], main_thread=MainThread(messages=ms)).into_dict(),
+    }
+    for name, f in cases.items():
+        seconds = measure(f, args.repeat)
+        print(
+            json.dumps(
+                {
+                    "benchmark": "data_conv",
+                    "case": name,
+                    "messages": args.messages,
+                    "seconds": round(seconds, 6),
+                    "messages_per_second": round(args.messages / seconds, 1),
+                }
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
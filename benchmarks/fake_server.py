@@ -0,0 +1,225 @@
+"""Stand-in OpenAI-compatible chat completions server for offline benchmarks."""
+
+import argparse
+import json
+import socket
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+
+@dataclass
+class Profile:
+    """Behavior of the fake model."""
+
+    latency: float = 0.0  # seconds to the first token
+    token_rate: float = 0.0  # tokens per second, 0 means unlimited
+    tokens: int = 32  # tokens per response
+    reply: str = ""  # content of every token, empty means w<number of input messages>.<token index>
+    latencies: list[float] = field(default_factory=list)  # latencies of the first requests, then latency
+    drops: list[int] = field(default_factory=list)  # tokens before the first streams drop, -1 means never
+    statuses: list[int] = field(default_factory=list)  # error statuses of the first requests, 200 means no error
+
+
+@dataclass
+class FakeServer:
+    """Serve /v1/chat/completions, streaming and not, in a daemon thread."""
+
+    profile: Profile = field(default_factory=Profile)
+    host: str = "127.0.0.1"
+    port: int = 0  # 0 means a free port
+    requests: int = 0
+    in_flight: int = 0  # requests being served
+    max_in_flight: int = 0  # maximum of in_flight
+    server: ThreadingHTTPServer | None = field(default=None, init=False, repr=False)
+    lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    @property
+    def base_url(self) -> str:
+        assert self.server is not None
+        return f"http://{self.host}:{self.server.server_address[1]}/v1"
+
+    def start(self) -> "FakeServer":
+        self.server = ThreadingHTTPServer((self.host, self.port), self.__handler())
+        self.server.daemon_threads = True
+        # clients cancel requests, e.g. on timeouts and hedging
+        self.server.handle_error = lambda *_: None  # type: ignore[method-assign]
+        threading.Thread(target=self.server.serve_forever, name="fake-server", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self) -> "FakeServer":
+        """Start the server."""
+        return self.start()
+
+    def __exit__(self, *_: Any) -> None:
+        """Stop the server."""
+        self.stop()
+
+    def __handler(self) -> type[BaseHTTPRequestHandler]:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self) -> None:
+                super().setup()
+                # headers and bodies are small separate writes
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def log_message(self, *_: Any) -> None:
+                pass
+
+            def do_POST(self) -> None:
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                n = fake.count()
+                latency = fake.nth(fake.profile.latencies, n, fake.profile.latency)
+                status = fake.nth(fake.profile.statuses, n, 200)
+                try:
+                    if status != 200:
+                        self.__error(status)
+                    elif body.get("stream"):
+                        self.__stream(body, latency, fake.nth(fake.profile.drops, n, -1))
+                    else:
+                        self.__complete(body, latency)
+                finally:
+                    fake.done()
+
+            def __error(self, status: int) -> None:
+                d = json.dumps({"error": {"message": "fake error", "type": "fake", "code": status}}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(d)))
+                self.end_headers()
+                self.wfile.write(d)
+
+            def __usage(self, body: dict[str, Any]) -> dict[str, int]:
+                prompt = len(json.dumps(body["messages"])) // 4 + 1
+                return {
+                    "prompt_tokens": prompt,
+                    "completion_tokens": fake.profile.tokens,
+                    "total_tokens": prompt + fake.profile.tokens,
+                }
+
+            def __chunk(self, body: dict[str, Any], choice: dict[str, Any], **kwargs: Any) -> bytes:
+                x = {
+                    "id": "fake",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": body["model"],
+                    "choices": [choice],
+                    **kwargs,
+                }
+                d = f"data: {json.dumps(x)}\n\n".encode()
+                return f"{len(d):x}\r\n".encode() + d + b"\r\n"
+
+            def __stream(self, body: dict[str, Any], latency: float, drop: int) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                time.sleep(latency)
+                for i, w in enumerate(fake.words(len(body["messages"]))):
+                    if i == drop:
+                        # close the connection without the end of the chunked body
+                        self.close_connection = True
+                        return
+                    delta = {"content": w} if i else {"role": "assistant", "content": w}
+                    self.wfile.write(self.__chunk(body, {"index": 0, "delta": delta, "finish_reason": None}))
+                    self.wfile.flush()
+                    fake.wait_token()
+                self.wfile.write(
+                    self.__chunk(body, {"index": 0, "delta": {}, "finish_reason": "stop"}, usage=self.__usage(body))
+                )
+                done = b"data: [DONE]\n\n"
+                self.wfile.write(f"{len(done):x}\r\n".encode() + done + b"\r\n0\r\n\r\n")
+                self.wfile.flush()
+
+            def __complete(self, body: dict[str, Any], latency: float) -> None:
+                time.sleep(latency)
+                words = fake.words(len(body["messages"]))
+                for _ in words:
+                    fake.wait_token()
+                r = {
+                    "id": "fake",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body["model"],
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": "".join(words)},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": self.__usage(body),
+                }
+                d = json.dumps(r).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(d)))
+                self.end_headers()
+                self.wfile.write(d)
+
+        return Handler
+
+    def count(self) -> int:
+        """Count a request and return its index."""
+        with self.lock:
+            n = self.requests
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        return n
+
+    def done(self) -> None:
+        """Count the end of a request."""
+        with self.lock:
+            self.in_flight -= 1
+
+    @staticmethod
+    def nth[T](values: list[T], n: int, default: T) -> T:
+        """Return the value of the n-th request."""
+        return values[n] if n < len(values) else default
+
+    def words(self, n: int) -> list[str]:
+        """Return the tokens of a response to n messages."""
+        if self.profile.reply:
+            return [self.profile.reply] * self.profile.tokens
+        return [f"w{n}.{i} " for i in range(self.profile.tokens)]
+
+    def wait_token(self) -> None:
+        if self.profile.token_rate > 0:
+            time.sleep(1 / self.profile.token_rate)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stand-in OpenAI-compatible chat completions server")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("-p", "--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to the first token")
+    parser.add_argument("--token_rate", type=float, default=0.0, help="tokens per second, 0 means unlimited")
+    parser.add_argument("--tokens", type=int, default=32, help="tokens per response")
+    args = parser.parse_args()
+
+    s = FakeServer(
+        profile=Profile(latency=args.latency, token_rate=args.token_rate, tokens=args.tokens),
+        host=args.host,
+        port=args.port,
+    ).start()
+    print(s.base_url, flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        s.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Measure meetings of N speakers x M turns against the fake server."""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from importlib.metadata import version
+from typing import Any
+
+from ai_roundtable.cli import dumps_thread, load_thread
+from ai_roundtable.yamlx import dumps as yaml_dumps
+
+from .fake_server import FakeServer, Profile
+
+
+def config(speakers: int) -> str:
+    return yaml_dumps({"speakers": [{"name": f"speaker{i}", "desc": f"speaker {i}"} for i in range(speakers)]})
+
+
+def measure(server: FakeServer, d: str, speakers: int, turns: int, extra: list[str]) -> dict[str, Any]:
+    cfg = os.path.join(d, f"config{speakers}.yml")
+    with open(cfg, "w") as f:
+        f.write(config(speakers))
+    out = os.path.join(d, f"thread{speakers}x{turns}.jsonl")
+    metrics_out = os.path.join(d, f"metrics{speakers}x{turns}.jsonl")
+    for x in [out, metrics_out]:
+        if os.path.exists(x):
+            os.remove(x)
+    argv = [
+        *[sys.executable, "-m", "ai_roundtable.cli"],
+        *["-c", cfg, "-a", "benchmark", "-u", server.base_url, "-m", "fake", "-n", str(turns)],
+        *["-o", out, "--metrics_out", metrics_out, "--quiet"],
+        *extra,
+    ]
+    requests = server.requests
+    start = time.perf_counter()
+    p = subprocess.Popen(argv, stdout=subprocess.DEVNULL, env={**os.environ, "OPENAI_AGENTS_DISABLE_TRACING": "1"})
+    _, status, rusage = os.wait4(p.pid, 0)
+    seconds = time.perf_counter() - start
+    if os.waitstatus_to_exitcode(status) != 0:
+        raise Exception(f"meeting failed: {' '.join(argv)}")
+
+    with open(metrics_out) as f:
+        ms = [json.loads(x) for x in f]
+    meeting = max(x["started"] + x["latency"] + x["hook"] for x in ms) - min(x["started"] for x in ms)
+    model = sum(x["latency"] for x in ms)
+
+    start = time.perf_counter()
+    c = load_thread("{}", out)
+    load = time.perf_counter() - start
+    start = time.perf_counter()
+    dumps_thread("jsonl", c.main_thread.messages)
+    save = time.perf_counter() - start
+
+    return {
+        "speakers": speakers,
+        "turns": turns,
+        "messages": len(c.main_thread),
+        "requests": server.requests - requests,
+        "seconds": round(seconds, 6),
+        "meeting_seconds": round(meeting, 6),
+        "model_seconds": round(model, 6),
+        "turns_per_second": round(turns / meeting, 3),
+        "overhead_per_turn": round((meeting - model) / turns, 6),
+        "thread_load_seconds": round(load, 6),
+        "thread_save_seconds": round(save, 6),
+        "maxrss_kb": rusage.ru_maxrss,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Measure meetings of N speakers x M turns against the fake server",
+        epilog="Other arguments are passed to ai_roundtable.cli, e.g. --pipeline -s 0",
+    )
+    parser.add_argument("-n", "--speakers", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("-m", "--turns", type=int, nargs="+", default=[8, 32])
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to the first token")
+    parser.add_argument("--token_rate", type=float, default=0.0, help="tokens per second, 0 means unlimited")
+    parser.add_argument("--tokens", type=int, default=32, help="tokens per response")
+    args, extra = parser.parse_known_args()
+    if "-s" not in extra and "--skip_eval" not in extra:
+        extra += ["-s", "-1"]  # only speakers
+    if "--disable_stream" not in extra:
+        extra += ["--disable_stream"]
+
+    profile = Profile(latency=args.latency, token_rate=args.token_rate, tokens=args.tokens)
+    with tempfile.TemporaryDirectory() as d, FakeServer(profile=profile) as server:
+        for n in args.speakers:
+            for m in args.turns:
+                r = measure(server, d, n, m, extra)
+                print(
+                    json.dumps(
+                        {
+                            "benchmark": "meeting",
+                            "version": version("ai_roundtable"),
+                            "latency": args.latency,
+                            "token_rate": args.token_rate,
+                            "tokens": args.tokens,
+                            "options": " ".join(extra),
+                            **r,
+                        }
+                    ),
+                    flush=True,
+                )
+
+
+if __name__ == "__main__":
+    main()
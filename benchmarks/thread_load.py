@@ -0,0 +1,60 @@
+"""Compare the load time of yaml and jsonl threads."""
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from ai_roundtable.cli import dumps_thread, load_thread
+from ai_roundtable.config import Message
+
+
+def messages(n: int, length: int) -> list[Message]:
+    line = "All work and no play makes Jack a dull boy.\n"
+    content = (line * (length // len(line) + 1))[:length]
+    return [Message(speaker=f"speaker{i % 4}", content=content) for i in range(n)]
+
+
+def measure(path: str, repeat: int) -> float:
+    r = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        load_thread("{}", path)
+        r.append(time.perf_counter() - start)
+    return statistics.median(r)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare the load time of yaml and jsonl threads")
+    parser.add_argument("-n", "--messages", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("-l", "--length", type=int, default=2000, help="characters per message")
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as d:
+        for n in args.messages:
+            ms = messages(n, args.length)
+            for fmt in ["yaml", "jsonl"]:
+                path = os.path.join(d, f"thread.{fmt}")
+                with open(path, "w") as f:
+                    print(dumps_thread(fmt, ms), file=f)
+                seconds = measure(path, args.repeat)
+                print(
+                    json.dumps(
+                        {
+                            "benchmark": "thread_load",
+                            "format": fmt,
+                            "messages": n,
+                            "length": args.length,
+                            "bytes": os.path.getsize(path),
+                            "seconds": round(seconds, 6),
+                            "messages_per_second": round(n / seconds, 1),
+                        }
+                    )
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Measure the memory of large threads."""
+
+import argparse
+import gc
+import json
+import tracemalloc
+
+from ai_roundtable.config import Message, MainThread
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure the memory of large threads")
+    parser.add_argument("-n", "--messages", type=int, default=50000)
+    parser.add_argument("-l", "--length", type=int, default=200, help="characters per message")
+    parser.add_argument("-s", "--speakers", type=int, default=4)
+    args = parser.parse_args()
+
+    lines = [
+        json.dumps({"speaker": f"speaker{i % args.speakers}", "content": f"{i:08d}".ljust(args.length, "x")})
+        for i in range(args.messages)
+    ]
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    # as if loaded from a jsonl thread
+    t = MainThread(messages=[Message.from_dict(json.loads(x)) for x in lines])  # type: ignore[no-untyped-call]
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(x.size_diff for x in after.compare_to(before, "filename"))
+    print(
+        json.dumps(
+            {
+                "benchmark": "thread_memory",
+                "messages": len(t),
+                "length": args.length,
+                "bytes": size,
+                "bytes_per_message": round(size / len(t), 1),
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
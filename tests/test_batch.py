@@ -0,0 +1,101 @@
+import tempfile
+import textwrap
+from pathlib import Path
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+from agents import set_tracing_disabled
+
+import ai_roundtable.batch as batch
+import ai_roundtable.cli as cli
+from ai_roundtable.yamlx import dumps as yaml_dumps, loads as yaml_loads
+from benchmarks.fake_server import FakeServer, Profile
+
+
+class TestBatch(TestCase):
+    def test_read_manifest(self):
+        testcases = [
+            (
+                "jsonl",
+                "jobs.jsonl",
+                textwrap.dedent(
+                    """\
+                    {"config": "c.yml", "agenda": "a1", "out": "o1.yml"}
+
+                    {"config": "c.yml", "thread": "t.yml", "name": "resume"}
+                    """
+                ),
+            ),
+            (
+                "yaml",
+                "jobs.yml",
+                textwrap.dedent(
+                    """\
+                    - config: c.yml
+                      agenda: a1
+                      out: o1.yml
+                    - config: c.yml
+                      thread: t.yml
+                      name: resume
+                    """
+                ),
+            ),
+        ]
+        want = [
+            batch.Job(config="c.yml", agenda="a1", out="o1.yml", name="0"),
+            batch.Job(config="c.yml", thread="t.yml", name="resume"),
+        ]
+        for title, name, content in testcases:
+            with self.subTest(title):
+                with tempfile.TemporaryDirectory() as d:
+                    p = Path(d) / name
+                    p.write_text(content)
+                    got = batch.read_manifest(str(p))
+                self.assertEqual(want, got)
+
+    def test_report(self):
+        got = batch.Report.new(
+            [
+                batch.JobResult(name="0", ok=True, messages=6, seconds=2),
+                batch.JobResult(name="1", ok=False, messages=0, seconds=1, error="e"),
+            ],
+            seconds=3,
+        )
+        self.assertEqual(2, got.jobs)
+        self.assertEqual(1, got.succeeded)
+        self.assertEqual(1, got.failed)
+        self.assertEqual(40, got.jobs_per_minute)
+        self.assertEqual(2, got.messages_per_second)
+
+
+class TestBatchRun(IsolatedAsyncioTestCase):
+    def setUp(self):
+        set_tracing_disabled(True)
+
+    async def test_main(self):
+        with tempfile.TemporaryDirectory() as d, FakeServer(profile=Profile(tokens=1, latency=0.1)) as server:
+            cfg = Path(d) / "config.yml"
+            cfg.write_text(yaml_dumps({"speakers": [{"name": "s1", "desc": "d1"}, {"name": "s2", "desc": "d2"}]}))
+            jobs = [{"config": str(cfg), "agenda": f"a{i}", "out": str(Path(d) / f"o{i}.jsonl")} for i in range(4)]
+            jobs[1]["config"] = str(Path(d) / "missing.yml")
+            manifest = Path(d) / "jobs.yml"
+            manifest.write_text(yaml_dumps(jobs))
+            report = Path(d) / "report.yml"
+            report.write_text("old report\n")
+            got = await cli.main(
+                [
+                    *["batch", str(manifest), "-j", "2", "-r", str(report)],
+                    *["-u", server.base_url, "-m", "fake", "-n", "2", "-s", "-1", "--quiet"],
+                ]
+            )
+            self.assertEqual(1, got)
+            self.assertEqual(2, server.max_in_flight, "concurrency")
+            self.assertEqual(6, server.requests)
+            r = yaml_loads(report.read_text())
+            self.assertEqual((4, 3, 1), (r["jobs"], r["succeeded"], r["failed"]))
+            self.assertEqual([True, False, True, True], [x["ok"] for x in r["results"]])
+            self.assertEqual([2, 0, 2, 2], [x["messages"] for x in r["results"]])
+            self.assertIn("missing.yml", r["results"][1]["error"])
+            self.assertEqual("", r["results"][0]["error"])
+            for i in [0, 2, 3]:
+                messages = cli.load_thread("{}", str(Path(d) / f"o{i}.jsonl")).main_thread.messages
+                self.assertEqual(["s1", "s2"], [x.speaker for x in messages])
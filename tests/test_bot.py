@@ -0,0 +1,89 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import patch
+
+import ai_roundtable.log as log
+from ai_roundtable.bot import Echo, Human, RollingSummary
+from ai_roundtable.config import MainThread, Message, Speaker
+from ai_roundtable.metrics import Metrics
+
+
+class TestEcho(TestCase):
+    def setUp(self):
+        self.got: list[str] = []
+        log.stream(log.StreamSink(targets=[self.got.append], flush_interval=0))
+
+    def tearDown(self):
+        log.stream_close()
+
+    def test_attempts(self):
+        testcases = [
+            ("once", [["ab", "c"]], "abc"),
+            ("retry prints the rest", [["a", "b"], ["ab", "cd"]], "abcd"),
+            ("retry splits deltas differently", [["abc"], ["a", "bcd", "e"]], "abcde"),
+            ("retry fails behind", [["abc"], ["a"], ["abc", "d"]], "abcd"),
+            ("retry passes and fails", [["a"], ["ab"], ["abc"]], "abc"),
+            ("retry diverges", [["ab"], ["ax", "y"]], "ab\naxy"),
+            ("retry ends within the printed text", [["abc"], ["ab"]], "abc\nab"),
+        ]
+        for title, attempts, want in testcases:
+            with self.subTest(title):
+                self.got.clear()
+                echo = Echo()
+                for i, deltas in enumerate(attempts):
+                    if i:
+                        echo.retry()
+                    for x in deltas:
+                        echo.write(x)
+                echo.end()
+                self.assertEqual(want, "".join(self.got))
+
+
+class FakeEvaluator:
+    def __init__(self, calls: list[list[str]], main_thread: MainThread):
+        self.calls = calls
+        self.main_thread = main_thread
+
+    async def complete(self, quiet: bool = False) -> str:
+        self.calls.append([x.content for x in self.main_thread.messages])
+        await asyncio.sleep(0)
+        return f"summary{len(self.calls)}"
+
+    def conclude(self, output: str) -> str:
+        return output
+
+
+class TestRollingSummary(IsolatedAsyncioTestCase):
+    async def test_update(self):
+        calls: list[list[str]] = []
+        summary = RollingSummary(new_evaluator=lambda t: FakeEvaluator(calls, t))
+        folded = [Message(speaker="s1", content=f"m{i}") for i in range(5)]
+        got = [await summary.update(folded[:n], step=2) for n in range(6)]
+        self.assertEqual(["", "", "summary1", "summary1", "summary2", "summary2"], got)
+        self.assertEqual([["m0", "m1"], ["summary1", "m2", "m3"]], calls)
+        self.assertEqual(4, summary.covered)
+
+    async def test_shared(self):
+        # the speakers of the same context update the summary at once
+        calls: list[list[str]] = []
+        summary = RollingSummary(new_evaluator=lambda t: FakeEvaluator(calls, t))
+        folded = [Message(speaker="s1", content=f"m{i}") for i in range(2)]
+        got = await asyncio.gather(*[summary.update(list(folded), step=2) for _ in range(3)])
+        self.assertEqual(["summary1"] * 3, got)
+        self.assertEqual(1, len(calls))
+
+
+class TestHuman(IsolatedAsyncioTestCase):
+    async def test_timeout(self):
+        testcases = [
+            ("skip", "", []),
+            ("default", "pass", ["pass"]),
+        ]
+        for title, default, want in testcases:
+            with self.subTest(title), patch("ai_roundtable.bot.read_user_input_async", side_effect=TimeoutError):
+                thread = MainThread(messages=[])
+                metrics = Metrics()
+                human = Human(main_thread=thread, speaker=Speaker(name="h"), end="E", default=default, metrics=metrics)
+                await human.reply()
+                self.assertEqual(want, [x.content for x in thread.messages])
+                self.assertEqual([("human", "h", "timeout")], [(x.kind, x.name, x.mode) for x in metrics.records])
@@ -0,0 +1,81 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+
+import ai_roundtable.cache as cache
+
+
+class TestResponseCache(TestCase):
+    def test_key(self):
+        items = [{"role": "user", "content": "c1"}]
+        k = cache.ResponseCache.key("m", "i", items)
+        self.assertEqual(k, cache.ResponseCache.key("m", "i", [{"content": "c1", "role": "user"}]))
+        self.assertNotEqual(k, cache.ResponseCache.key("m2", "i", items))
+        self.assertNotEqual(k, cache.ResponseCache.key("m", "i2", items))
+        self.assertNotEqual(k, cache.ResponseCache.key("m", "i", [{"role": "user", "content": "c2"}]))
+
+    def test_get_put(self):
+        with tempfile.TemporaryDirectory() as d:
+            c = cache.ResponseCache(dir=d)
+            self.assertIsNone(c.get("k1"))
+            c.put("k1", cache.Response(output="out", deltas=["o", "ut"]))
+            got = c.get("k1")
+            self.assertIsNotNone(got)
+            self.assertEqual("out", got.output)
+            self.assertEqual(["o", "ut"], got.deltas)
+
+    def test_ttl(self):
+        with tempfile.TemporaryDirectory() as d:
+            c = cache.ResponseCache(dir=d, ttl=60)
+            c.put("k1", cache.Response(output="out"))
+            p = Path(d) / "k1.json"
+            v = json.loads(p.read_text())
+            v["created"] -= 120
+            p.write_text(json.dumps(v))
+            self.assertIsNone(c.get("k1"))
+
+    def test_evict(self):
+        with tempfile.TemporaryDirectory() as d:
+            c = cache.ResponseCache(dir=d, max_entries=2)
+            for i, k in enumerate(["k1", "k2"]):
+                c.put(k, cache.Response(output=k))
+                os.utime(Path(d) / f"{k}.json", (i, i))
+            c.get("k1")  # k2 is the least recently used
+            c.put("k3", cache.Response(output="k3"))
+            self.assertIsNotNone(c.get("k1"))
+            self.assertIsNone(c.get("k2"))
+            self.assertIsNotNone(c.get("k3"))
+
+    def test_ttl_sweep(self):
+        with tempfile.TemporaryDirectory() as d:
+            c = cache.ResponseCache(dir=d, ttl=60)
+            c.put("k1", cache.Response(output="k1"))
+            p = Path(d) / "k1.json"
+            v = json.loads(p.read_text())
+            v["created"] -= 120
+            p.write_text(json.dumps(v))
+            os.utime(p, (v["created"], v["created"]))
+            self.assertIsNone(c.get("k1"))
+            self.assertFalse(p.exists(), "expired on get")
+
+            c.put("k2", cache.Response(output="k2"))
+            p = Path(d) / "k2.json"
+            created = p.stat().st_mtime - 120
+            os.utime(p, (created, created))
+            c.evicted_at -= 120
+            c.put("k3", cache.Response(output="k3"))
+            self.assertFalse(p.exists(), "expired on sweep")
+
+    def test_evict_threshold(self):
+        with tempfile.TemporaryDirectory() as d:
+            c = cache.ResponseCache(dir=d, max_entries=10)
+            with patch("os.scandir", wraps=os.scandir) as scandir:
+                for i in range(20):
+                    c.put(f"k{i}", cache.Response(output=f"k{i}"))
+                    c.put(f"k{i}", cache.Response(output=f"k{i}"))
+            # the first put, and k10, k12, ..., k18 over max_entries, each eviction leaves 9 entries
+            self.assertEqual(6, scandir.call_count)
+            self.assertEqual(10, len(list(Path(d).glob("*.json"))))
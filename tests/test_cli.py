@@ -0,0 +1,84 @@
+import json
+import subprocess
+import sys
+import tempfile
+import tomllib
+from pathlib import Path
+from unittest import TestCase
+
+import ai_roundtable.cli as cli
+from ai_roundtable.skeleton import Skeleton
+from ai_roundtable.yamlx import dumps as yaml_dumps
+
+# the LLM stack, imported only when a meeting starts
+heavy = {"agents", "openai", "httpx"}
+
+
+def imported(*args: str) -> dict[str, int]:
+    r = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "ai_roundtable.cli", *args],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=True,
+    )
+    modules = {}
+    for x in r.stderr.splitlines():
+        if not x.startswith("import time:") or "cumulative" in x:
+            continue
+        _, cumulative, name = x.removeprefix("import time:").split("|")
+        modules[name.strip()] = int(cumulative)
+    return modules
+
+
+class TestImportTime(TestCase):
+    def test_lightweight(self):
+        with tempfile.TemporaryDirectory() as d:
+            cfg = Path(d) / "config.yml"
+            cfg.write_text(Skeleton.dual())
+            testcases = [
+                ("help", ["-h"]),
+                ("skeleton", ["--skeleton", "dual"]),
+                ("instructions", ["-c", str(cfg), "-a", "agenda", "--instructions", "0"]),
+            ]
+            for title, args in testcases:
+                with self.subTest(title):
+                    modules = imported(*args)
+                    got = {k: v for k, v in modules.items() if k in heavy}
+                    self.assertEqual({}, got, "microseconds of the cumulative import time")
+
+
+class TestConvert(TestCase):
+    def test_round_trip(self):
+        messages = [{"content": "hello", "speaker": "s1"}, {"content": "multi\nline", "speaker": "s2"}]
+        testcases = [
+            ("yaml", "thread.yml", yaml_dumps(messages)),
+            ("jsonl", "thread.jsonl", "".join(f"{json.dumps(x)}\n" for x in messages)),
+        ]
+        for title, name, content in testcases:
+            with self.subTest(title), tempfile.TemporaryDirectory() as d:
+                src = Path(d) / name
+                src.write_text(content)
+                dest = Path(d) / f"converted.{name}"
+                self.assertEqual(0, cli.convert([str(src), str(dest)]))
+                self.assertEqual(content, dest.read_text())
+
+
+class TestScript(TestCase):
+    def test_skeleton(self):
+        with open(Path(__file__).parent.parent / "pyproject.toml", "rb") as f:
+            module, func = tomllib.load(f)["project"]["scripts"]["ai_roundtable"].split(":")
+        # what the installed script runs
+        r = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                f"import sys; from {module} import {func}; sys.exit({func}())",
+                "--skeleton",
+                "minimal",
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        self.assertEqual(f"{Skeleton.minimal()}\n", r.stdout)
@@ -2,6 +2,7 @@ import textwrap
 from unittest import TestCase
 
 import ai_roundtable.config as config
+import ai_roundtable.data as data
 
 
 class TestRole(TestCase):
@@ -99,3 +100,228 @@ class TestRole(TestCase):
                 self.assertEqual(want, got)
                 rgot = config.ConfigYaml.from_config(want).into_config()
                 self.assertEqual(want, rgot)
+
+
+class TestConfigIndex(TestCase):
+    def test_init(self):
+        with self.assertRaises(TypeError):
+            config.Config(main_thread=config.MainThread(messages=[]), speaker_index=None)
+
+    def test_index(self):
+        c = config.Config(
+            speakers=[config.Speaker(name="s1"), config.Speaker(name="s2")],
+            system=[config.Speaker(name="end", model="m"), config.Speaker(name="e1", desc="e1desc")],
+            main_thread=config.MainThread(messages=[]),
+        )
+        c.setup()
+        index = c.index
+        with self.subTest("cached"):
+            self.assertIs(index, c.index)
+            self.assertEqual(["s1", "s2"], list(c.speaker_dict.elems.keys()))
+            self.assertEqual("m", c.end_evaluator.model)
+            self.assertEqual("summary", c.summary_evaluator.name)
+            self.assertEqual(["e1"], [x.name for x in c.raw_evaluators])
+            self.assertEqual(["s1", "s2", "s1"], [c.speaker_of_turn(x).name for x in [1, 2, 3]])
+        with self.subTest("rebuilt"):
+            c.speakers.append(config.Speaker(name="s3"))
+            self.assertIs(index, c.index)
+            c.invalidate_index()
+            self.assertIsNot(index, c.index)
+            self.assertEqual(["s1", "s2", "s3"], list(c.speaker_dict.elems.keys()))
+            self.assertEqual("s3", c.speaker_of_turn(3).name)
+        with self.subTest("renamed"):
+            c.speakers[0].name = "s0"
+            c.invalidate_index()
+            self.assertEqual(["s0", "s2", "s3"], list(c.speaker_dict.elems.keys()))
+
+
+class TestConfigJsonl(TestCase):
+    def test_roundtrip(self):
+        want = config.Config(
+            speakers=[config.Speaker(name="s1", desc="s1desc")],
+            main_thread=config.MainThread(
+                messages=[
+                    config.Message(speaker="s1", content="line1\nline2"),
+                    config.Message(speaker="s2", content="日本語"),
+                ]
+            ),
+        )
+        got = config.ConfigJsonl.from_config(want)
+        self.assertEqual(2, len(list(got.thread)))
+        self.assertEqual(want, got.into_config())
+
+    def test_skip_blank_lines(self):
+        c = config.ConfigJsonl(
+            config="speakers: []",
+            thread=['{"speaker": "s1", "content": "c1"}', "", '{"speaker": "s2", "content": "c2"}\n'],
+        ).into_config()
+        self.assertEqual(["c1", "c2"], [x.content for x in c.main_thread.messages])
+
+
+class TestMessage(TestCase):
+    def test_compact(self):
+        m = config.Message.from_dict({"speaker": "".join(["s", "1"]), "content": "c1"})
+        self.assertFalse(hasattr(m, "__dict__"))
+        self.assertIs(m.speaker, config.Message(speaker="".join(["s", "1"]), content="c2").speaker)
+        with self.assertRaises(data.MetaException):
+            config.Message(speaker="", content="c")
+
+    def test_thread(self):
+        t = config.MainThread(messages=[])
+        for i in range(3):
+            t.append(speaker=f"s{i % 2}", content=f"c{i}")
+        self.assertEqual(3, len(t))
+        self.assertEqual(["c1", "c2"], [x.content for x in t.latest(2).messages])
+        self.assertEqual(["c0", "c2"], [x.content for x in t.select(lambda x: x.speaker == "s0").messages])
+        self.assertEqual({"speaker": "s0", "content": "c0"}, t.messages[0].into_dict())
+
+    def test_identity(self):
+        m = config.Message(speaker="s1", content="c1")
+        want = config.Message(speaker="s1", content="c1").identity()
+        self.assertEqual(want, m.identity())
+        self.assertIs(m.identity(), m.identity())
+        m.content = "c2"
+        self.assertEqual(config.Message(speaker="s1", content="c2").identity(), m.identity())
+        m.speaker = "s2"
+        self.assertEqual(config.Message(speaker="s2", content="c2").identity(), m.identity())
+        self.assertEqual({"speaker": "s2", "content": "c2"}, m.into_dict())
+        self.assertEqual(config.Message(speaker="s2", content="c2"), m)
+
+
+class TestThread(TestCase):
+    def test_index(self):
+        t = config.MainThread(messages=[config.Message(speaker="s1", content="c1")])
+        self.assertIn(config.Message(speaker="s1", content="c1"), t)
+        self.assertNotIn(config.Message(speaker="s1", content="c2"), t)
+        with self.subTest("appended"):
+            t.append(speaker="s1", content="c2")
+            self.assertEqual(1, t.index(config.Message(speaker="s1", content="c2")))
+        with self.subTest("replaced"):
+            t.messages = [config.Message(speaker="s2", content="c3")]
+            self.assertEqual(0, t.index(config.Message(speaker="s2", content="c3")))
+            self.assertNotIn(config.Message(speaker="s1", content="c1"), t)
+
+    def test_merge(self):
+        t = config.Thread(messages=[config.Message(speaker="s1", content="c1")])
+        n = t.merge(
+            [
+                config.Message(speaker="s1", content="c1"),
+                config.Message(speaker="s2", content="c2"),
+                config.Message(speaker="s2", content="c2"),
+                config.Message(speaker="s1", content="c3"),
+            ]
+        )
+        self.assertEqual(2, n)
+        self.assertEqual(["c1", "c2", "c3"], [x.content for x in t.messages])
+        self.assertEqual(2, t.index(config.Message(speaker="s1", content="c3")))
+
+    def test_identity_index_add(self):
+        index = config.IdentityIndex()
+        ms: list[config.Message] = []
+        self.assertTrue(index.add(ms, config.Message(speaker="s1", content="c1")))
+        self.assertFalse(index.add(ms, config.Message(speaker="s1", content="c1")))
+        ms.append(config.Message(speaker="s1", content="c2"))  # appended without the index
+        self.assertFalse(index.add(ms, config.Message(speaker="s1", content="c2")))
+        self.assertTrue(index.add(ms, config.Message(speaker="s1", content="c3")))
+        self.assertEqual(["c1", "c2", "c3"], [x.content for x in ms])
+        self.assertEqual((3, 2), (index.size, index.positions[ms[2].identity()]))
+
+    def test_dedup(self):
+        t = config.Thread(
+            messages=[
+                config.Message(speaker="s1", content="c1"),
+                config.Message(speaker="s2", content="c1"),
+                config.Message(speaker="s1", content="c1"),
+            ]
+        )
+        self.assertEqual(["s1", "s2"], [x.speaker for x in t.dedup().messages])
+        self.assertEqual(3, len(t))
+
+
+class TestLimits(TestCase):
+    def test_limits_of(self):
+        c = config.ConfigYaml(
+            config=textwrap.dedent(
+                """\
+                limits:
+                  max_in_flight: 2
+                speakers:
+                - name: s1
+                - name: s2
+                  base_url: http://localhost:11434/v1
+                  limits:
+                    rate: 2
+                    burst: 3
+                    adaptive: true
+                """
+            ),
+            thread="",
+        ).into_config()
+        self.assertEqual(config.Limits(max_in_flight=2), c.limits_of(c.speakers[0]))
+        self.assertEqual(config.Limits(max_in_flight=2, rate=2.0, burst=3, adaptive=True), c.limits_of(c.speakers[1]))
+        self.assertIsInstance(c.limits_of(c.speakers[1]).rate, float)
+
+
+class TestOverride(TestCase):
+    def test_sections_of(self):
+        c = config.ConfigYaml(
+            config=textwrap.dedent(
+                """\
+                context:
+                  latest: 4
+                  summary: true
+                limits:
+                  max_in_flight: 2
+                  rate: 1
+                retry:
+                  retries: 3
+                  timeout: 5
+                speakers:
+                - name: unset
+                - name: defaults
+                  context:
+                    latest: 0
+                    summary: false
+                  limits:
+                    max_in_flight: 0
+                    rate: 0
+                  retry:
+                    retries: 0
+                    timeout: 0
+                - name: partial
+                  context:
+                    latest: 0
+                  limits:
+                    max_in_flight: 0
+                  retry:
+                    retries: 0
+                """
+            ),
+            thread="",
+        ).into_config()
+        testcases = [
+            (
+                "unset",
+                config.Context(latest=4, summary=True),
+                config.Limits(max_in_flight=2, rate=1.0),
+                config.Retry(retries=3, timeout=5.0),
+            ),
+            ("defaults", config.Context(), config.Limits(), config.Retry()),
+            (
+                "partial",
+                config.Context(summary=True),
+                config.Limits(rate=1.0),
+                config.Retry(timeout=5.0),
+            ),
+        ]
+        for (name, context, limits, retry), speaker in zip(testcases, c.speakers):
+            with self.subTest(name):
+                self.assertEqual(name, speaker.name)
+                self.assertEqual(context, c.context_of(speaker))
+                self.assertEqual(limits, c.limits_of(speaker))
+                self.assertEqual(retry, c.retry_of(speaker))
+        with self.subTest("roundtrip"):
+            self.assertEqual(c, config.ConfigYaml.from_config(c).into_config())
+            self.assertEqual(
+                {"name", "desc", "human", "model", "base_url", "api_key_env"}, set(c.speakers[0].into_dict())
+            )
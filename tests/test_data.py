@@ -99,6 +99,32 @@ class TestData(TestCase):
         )
         self.assertEqual(want, got)
 
+    def test_optional(self):
+        @dataclass
+        class TestOptionalInternal(data.IntoDict, data.FromDict):
+            val: int = data.meta(desc="intval").field(int, default=0)
+
+        @dataclass
+        class TestOptional(data.IntoDict, data.FromDict):
+            num: int | None = data.meta(desc="numval").field(int, default=None)
+            internal: TestOptionalInternal | None = data.meta(desc="internalval").field(
+                TestOptionalInternal, default=None
+            )
+
+        testcases = [
+            ("unset", {}, TestOptional()),
+            ("null", {"num": None, "internal": None}, TestOptional()),
+            ("set", {"num": 1, "internal": {"val": 0}}, TestOptional(num=1, internal=TestOptionalInternal())),
+        ]
+        for title, d, want in testcases:
+            with self.subTest(title):
+                got = TestOptional.from_dict(d)
+                self.assertEqual(want, got)
+                self.assertEqual({k: v for k, v in d.items() if v is not None}, got.into_dict())
+        with self.subTest("invalid"):
+            with self.assertRaises(data.MetaException):
+                TestOptional.from_dict({"num": "1"})
+
     def test_desc(self):
         @dataclass
         class TestDesc(data.Desc):
@@ -118,3 +144,42 @@ class TestData(TestCase):
             ],
         )
         self.assertEqual(want, got)
+
+    def test_plan(self):
+        @dataclass
+        class TestPlan(data.Validator, data.IntoDict, data.FromDict):
+            num: int = data.meta(desc="positive number", validator=lambda x: x > 0).field(int)
+            strs: list[str] = data.meta(desc="strings").field(list[str], default_factory=list)
+
+        class TestPlanChild(TestPlan):
+            pass
+
+        with self.subTest("cached"):
+            self.assertEqual(TestPlan(num=1, strs=["s"]), TestPlan.from_dict({"num": 1, "strs": ["s"]}))
+            self.assertEqual({"num": 2, "strs": []}, TestPlan(num=2).into_dict())
+            plans = [TestPlan._from_dict_plan, TestPlan._into_dict_plan, TestPlan._validator_plan]
+            self.assertEqual(TestPlan(num=3), TestPlan.from_dict({"num": 3}))
+            self.assertEqual(plans, [TestPlan._from_dict_plan, TestPlan._into_dict_plan, TestPlan._validator_plan])
+        with self.subTest("subclass"):
+            got = TestPlanChild.from_dict({"num": 1})
+            self.assertIsInstance(got, TestPlanChild)
+            self.assertIn("_from_dict_plan", TestPlanChild.__dict__)
+        with self.subTest("invalid"):
+            with self.assertRaises(data.MetaException):
+                TestPlan.from_dict({"num": 0})
+            with self.assertRaises(data.MetaException):
+                TestPlan.from_dict({"num": "1"})
+            with self.assertRaises(data.MetaException):
+                TestPlan.from_dict({"num": 1, "strs": [1]})
+            with self.assertRaises(data.MetaException):
+                TestPlan.from_dict({"strs": []})
+
+    def test_no_meta(self):
+        @dataclass
+        class TestNoMeta(data.IntoDict, data.FromDict):
+            num: int
+
+        with self.assertRaises(data.MetaException):
+            TestNoMeta.from_dict({"num": 1})
+        with self.assertRaises(data.MetaException):
+            TestNoMeta(num=1).into_dict()
@@ -0,0 +1,161 @@
+import asyncio
+import os
+import tempfile
+import time
+from pathlib import Path
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import patch
+
+import ai_roundtable.io as io
+
+
+class TestWriter(TestCase):
+    def test_write(self):
+        testcases = [
+            ("every message", 1, ["m1\n", "m1\nm2\n", "m1\nm2\nm3\n"]),
+            ("every 2 messages", 2, ["", "m1\nm2\n", "m1\nm2\n"]),
+            ("only at close", 0, ["", "", ""]),
+        ]
+        for title, flush_messages, want in testcases:
+            with self.subTest(title):
+                with tempfile.TemporaryDirectory() as d:
+                    p = Path(d) / "out.yml"
+                    w = io.Writer.new(str(p), flush_messages=flush_messages)
+                    got = []
+                    for m in ["m1", "m2", "m3"]:
+                        w.write(m)
+                        got.append(p.read_text() if p.exists() else "")
+                    self.assertEqual(want, got)
+                    w.close()
+                    self.assertEqual("m1\nm2\nm3\n", p.read_text())
+                    self.assertIsNone(w.file)
+
+    def test_interval(self):
+        # without an event loop, the interval is checked at the next write
+        with tempfile.TemporaryDirectory() as d:
+            p = Path(d) / "out.yml"
+            w = io.Writer.new(str(p), flush_messages=0, flush_interval=0.05)
+            w.write("m1")
+            self.assertEqual("", p.read_text())
+            time.sleep(0.1)
+            w.write("m2")
+            self.assertEqual("m1\nm2\n", p.read_text())
+            w.close()
+
+    def test_fsync(self):
+        testcases = [
+            ("disabled", False, 0),
+            ("enabled", True, 3),  # 2 flushes by messages and 1 at close
+        ]
+        for title, fsync, want in testcases:
+            with self.subTest(title), tempfile.TemporaryDirectory() as d, patch("ai_roundtable.io.os.fsync") as f:
+                w = io.Writer.new(str(Path(d) / "out.yml"), flush_messages=1, fsync=fsync)
+                w.write("m1")
+                w.write("m2")
+                w.close()
+                self.assertEqual(want, f.call_count)
+
+
+class TestWriterTimer(IsolatedAsyncioTestCase):
+    async def test_flush_without_write(self):
+        with tempfile.TemporaryDirectory() as d:
+            p = Path(d) / "out.yml"
+            w = io.Writer.new(str(p), flush_messages=0, flush_interval=0.05)
+            w.write("m1")
+            self.assertEqual("", p.read_text())
+            await asyncio.sleep(0.1)
+            self.assertEqual("m1\n", p.read_text())
+            self.assertIsNone(w.timer)
+            w.close()
+
+    async def test_flush_cancels_timer(self):
+        with tempfile.TemporaryDirectory() as d:
+            p = Path(d) / "out.yml"
+            w = io.Writer.new(str(p), flush_messages=2, flush_interval=0.05)
+            w.write("m1")
+            w.write("m2")
+            self.assertIsNone(w.timer)
+            w.write("m3")
+            w.close()
+            self.assertIsNone(w.timer)
+            await asyncio.sleep(0.1)
+            self.assertEqual("m1\nm2\nm3\n", p.read_text())
+
+
+class TestLineReader(TestCase):
+    def test_read(self):
+        r, w = os.pipe()
+        with os.fdopen(r) as rf, os.fdopen(w, "w") as wf:
+            reader = io.LineReader(file=rf, poll_interval=0.05)
+
+            async def read() -> tuple[list[str], float]:
+                wf.write("l1\nl2\nEND\nl3\n")
+                wf.flush()
+                got = await io.read_user_input_async("END", reader=reader)
+                start = time.monotonic()
+                with self.assertRaises(TimeoutError):
+                    await io.read_user_input_async("END", timeout=0.2, reader=reader)
+                elapsed = time.monotonic() - start
+                wf.close()
+                with self.assertRaises(EOFError):
+                    await io.read_user_input_async("END", reader=reader)
+                return got, elapsed
+
+            got, elapsed = asyncio.run(read())
+            self.assertEqual(["l1", "l2"], got)
+            self.assertGreaterEqual(elapsed, 0.2)
+
+    def test_not_blocking(self):
+        r, w = os.pipe()
+        with os.fdopen(r) as rf, os.fdopen(w, "w") as wf:
+            reader = io.LineReader(file=rf, poll_interval=0.05)
+            ticks = []
+
+            async def tick() -> None:
+                for i in range(3):
+                    ticks.append(i)
+                    await asyncio.sleep(0.01)
+                wf.write("l1\nEND\n")
+                wf.flush()
+
+            async def run() -> list[str]:
+                got, _ = await asyncio.gather(io.read_user_input_async("END", timeout=5, reader=reader), tick())
+                return got
+
+            self.assertEqual(["l1"], asyncio.run(run()))
+            self.assertEqual([0, 1, 2], ticks)
+
+    def test_timeout_keeps_lines(self):
+        r, w = os.pipe()
+        with os.fdopen(r) as rf, os.fdopen(w, "w") as wf:
+            reader = io.LineReader(file=rf, poll_interval=0.01)
+
+            async def read() -> list[str]:
+                wf.write("l1\nl2\n")
+                wf.flush()
+                with self.assertRaises(TimeoutError):
+                    await io.read_user_input_async("END", timeout=0.2, reader=reader)
+                wf.write("l3\nEND\nl4\nEND\n")
+                wf.flush()
+                return await io.read_user_input_async("END", reader=reader)
+
+            self.assertEqual(["l1", "l2", "l3"], asyncio.run(read()))
+
+    def test_cancel_keeps_lines(self):
+        r, w = os.pipe()
+        with os.fdopen(r) as rf, os.fdopen(w, "w") as wf:
+            reader = io.LineReader(file=rf, poll_interval=0.01)
+
+            async def read() -> list[str]:
+                task = asyncio.create_task(io.read_user_input_async("END", reader=reader))
+                wf.write("l1\n")
+                wf.flush()
+                await asyncio.sleep(0.1)
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+                wf.write("l2\nEND\n")
+                wf.flush()
+                return await io.read_user_input_async("END", reader=reader)
+
+            self.assertEqual(["l1", "l2"], asyncio.run(read()))
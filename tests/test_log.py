@@ -0,0 +1,55 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+import ai_roundtable.log as log
+
+
+class TestStreamSink(TestCase):
+    def test_write(self):
+        testcases = [
+            ("every write", 0, 0, ["a", "bb", "ccc"]),
+            ("by size", 60, 3, ["abb", "ccc"]),
+            ("only at flush", 60, 0, []),
+        ]
+        for title, flush_interval, flush_size, want in testcases:
+            with self.subTest(title):
+                got: list[str] = []
+                sink = log.StreamSink(targets=[got.append], flush_interval=flush_interval, flush_size=flush_size)
+                for x in ["a", "bb", "ccc"]:
+                    sink.write(x)
+                self.assertEqual(want, got)
+                sink.flush()
+                self.assertEqual("abbccc", "".join(got))
+
+    def test_targets(self):
+        got1: list[str] = []
+        got2: list[str] = []
+        sink = log.StreamSink(targets=[got1.append, got2.append], flush_interval=60)
+        sink.write("a")
+        sink.write("b")
+        sink.flush()
+        sink.flush()
+        self.assertEqual(["ab"], got1)
+        self.assertEqual(["ab"], got2)
+
+
+class TestStreamSinkTimer(IsolatedAsyncioTestCase):
+    async def test_flush_without_write(self):
+        got: list[str] = []
+        sink = log.StreamSink(targets=[got.append], flush_interval=0.05)
+        sink.write("a")
+        self.assertEqual([], got)
+        await asyncio.sleep(0.1)
+        self.assertEqual(["a"], got)
+        self.assertIsNone(sink.timer)
+
+    async def test_flush_cancels_timer(self):
+        got: list[str] = []
+        sink = log.StreamSink(targets=[got.append], flush_interval=0.05)
+        sink.write("a")
+        sink.flush()
+        sink.write("b")
+        await asyncio.sleep(0.01)
+        self.assertEqual(["a"], got)
+        await asyncio.sleep(0.1)
+        self.assertEqual(["a", "b"], got)
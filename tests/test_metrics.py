@@ -0,0 +1,60 @@
+import json
+from unittest import TestCase
+
+import ai_roundtable.metrics as metrics
+
+
+class TestMetrics(TestCase):
+    def test_record(self):
+        ms = metrics.Metrics(meeting="m1")
+        lines: list[str] = []
+        ms.listen(metrics.jsonl_listener(lines.append))
+        ms.turn = 1
+        ms.record(metrics.Metric(kind="bot", name="s1", model="x", latency=1.0, ttft=0.5, input_tokens=10))
+        ms.turn = 2
+        ms.record(metrics.Metric(kind="bot", name="s1", model="x", latency=3.0, ttft=0.5, input_tokens=20))
+        ms.record(metrics.Metric(kind="human", name="s2", turn=9, latency=5.0))
+
+        self.assertEqual([1, 2, 9], [x.turn for x in ms.records])
+        got = [json.loads(x) for x in lines]
+        self.assertEqual(["m1", "m1", "m1"], [x["meeting"] for x in got])
+        self.assertEqual(3.0, got[1]["latency"])
+
+        want = [
+            metrics.MetricSummary(
+                kind="human",
+                name="s2",
+                model="",
+                count=1,
+                ttft=0,
+                latency=5,
+                latency_max=5,
+                hook=0,
+                input_tokens=0,
+                output_tokens=0,
+            ),
+            metrics.MetricSummary(
+                kind="bot",
+                name="s1",
+                model="x",
+                count=2,
+                ttft=0.5,
+                latency=2,
+                latency_max=3,
+                hook=0,
+                input_tokens=30,
+                output_tokens=0,
+            ),
+        ]
+        self.assertEqual(want, ms.summary())
+
+    def test_table(self):
+        ms = metrics.Metrics()
+        ms.record(metrics.Metric(kind="evaluator", name="end", model="m", latency=1.25, ttft=1.25))
+        want = "\n".join(
+            [
+                "kind       name  model  count  ttft   latency  max    hook   in  out",
+                "evaluator  end   m      1      1.250  1.250    1.250  0.000  0   0",
+            ]
+        )
+        self.assertEqual(want, ms.table())
@@ -0,0 +1,364 @@
+import contextlib
+import io
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+import openai
+from agents import Runner, set_tracing_disabled
+
+import ai_roundtable.cli as cli
+from ai_roundtable.config import Message
+from ai_roundtable.log import log
+from ai_roundtable.mtg import Meeting
+from ai_roundtable.rule import Rule
+from ai_roundtable.yamlx import dumps as yaml_dumps, loads as yaml_loads
+from benchmarks.fake_server import FakeServer, Profile
+
+
+async def meeting(
+    server: FakeServer, speakers: int, turns: int, *extra: str, **c: Any
+) -> tuple[list[Message], list[dict]]:
+    """Run a meeting against the server, return the messages and the metrics."""
+    with tempfile.TemporaryDirectory() as d:
+        cfg = Path(d) / "config.yml"
+        cfg.write_text(
+            yaml_dumps({"speakers": [{"name": f"s{i}", "desc": f"d{i}"} for i in range(1, speakers + 1)], **c})
+        )
+        out = Path(d) / "thread.jsonl"
+        metrics_out = Path(d) / "metrics.jsonl"
+        got = await cli.main(
+            [
+                *["-c", str(cfg), "-a", "agenda", "-u", server.base_url, "-m", "fake", "-n", str(turns)],
+                *["-o", str(out), "--metrics_out", str(metrics_out), "--quiet", *extra],
+            ]
+        )
+        assert got == 0
+        return (
+            cli.load_thread("{}", str(out)).main_thread.messages,
+            [json.loads(x) for x in metrics_out.read_text().splitlines()],
+        )
+
+
+class TestMeeting(IsolatedAsyncioTestCase):
+    def setUp(self):
+        set_tracing_disabled(True)
+
+    async def test_start(self):
+        testcases = [
+            ("run", ["--disable_stream"], "run"),
+            ("streamed", [], "streamed"),
+        ]
+        for title, extra, mode in testcases:
+            with self.subTest(title):
+                with FakeServer(profile=Profile(tokens=4)) as server:
+                    messages, ms = await meeting(server, 2, 3, "-s", "-1", *extra)
+                    self.assertEqual(3, server.requests)
+                self.assertEqual(["s1", "s2", "s1"], [x.speaker for x in messages])
+                self.assertTrue(all(x.content.startswith("w") for x in messages))
+                self.assertEqual([mode] * 3, [x["mode"] for x in ms])
+                self.assertEqual([4] * 3, [x["output_tokens"] for x in ms])
+
+    async def test_run_mode(self):
+        # Runner.run if nobody watches the stream: streaming disabled, or the quiet reply generated ahead
+        testcases = [
+            ("disabled", ["--disable_stream"], ["run"] * 6, 8, 0),
+            ("pipeline", ["--pipeline"], ["streamed"] * 4 + ["run", "streamed"], 1, 7),
+        ]
+        for title, extra, want_modes, want_run, want_streamed in testcases:
+            with (
+                self.subTest(title),
+                FakeServer(profile=Profile(tokens=2)) as server,
+                contextlib.redirect_stdout(io.StringIO()),
+                patch.object(Runner, "run", wraps=Runner.run) as run,
+                patch.object(Runner, "run_streamed", wraps=Runner.run_streamed) as run_streamed,
+            ):
+                _, ms = await meeting(server, 2, 6, *extra)
+                self.assertEqual(want_modes, [x["mode"] for x in ms if x["kind"] == "bot"])
+                self.assertEqual((want_run, want_streamed), (run.call_count, run_streamed.call_count))
+
+    async def test_reuse(self):
+        # a bot and its instructions per speaker for the whole meeting, the pipelined replies included
+        for title, extra in [("serial", []), ("pipeline", ["--pipeline"])]:
+            with (
+                self.subTest(title),
+                FakeServer(profile=Profile(tokens=1)) as server,
+                patch.object(Meeting, "new_bot", autospec=True, side_effect=Meeting.new_bot) as new_bot,
+                patch.object(Rule, "print_rules", autospec=True, side_effect=Rule.print_rules) as print_rules,
+            ):
+                messages, _ = await meeting(server, 2, 6, "--disable_stream", *extra)
+                self.assertEqual(6, len(messages))
+                self.assertEqual(["s1", "s2"], [x.args[1].name for x in new_bot.call_args_list])
+                self.assertEqual(["s1", "s2"], [x.kwargs["speaker"] for x in print_rules.call_args_list])
+
+    async def test_cache(self):
+        # the second meeting replays the replies of the first one without requests
+        with FakeServer(profile=Profile(tokens=3)) as server, tempfile.TemporaryDirectory() as d:
+            runs = []
+            for _ in range(2):
+                requests = server.requests
+                with contextlib.redirect_stdout(io.StringIO()) as stdout:
+                    messages, ms = await meeting(server, 2, 4, "-s", "-1", "--cache_dir", d)
+                runs.append((messages, stdout.getvalue(), [x["mode"] for x in ms], server.requests - requests))
+        self.assertEqual([(["streamed"] * 4, 4), (["cached"] * 4, 0)], [(x[2], x[3]) for x in runs])
+        self.assertEqual(runs[0][0], runs[1][0], "thread")
+        self.assertEqual(runs[0][1], runs[1][1], "stream")
+        self.assertIn(runs[0][0][0].content, runs[0][1])
+
+    async def test_speculative(self):
+        def evaluations(ms: list[dict]) -> list[tuple[int, str]]:
+            return [(x["turn"], x["name"]) for x in ms if x["kind"] == "evaluator"]
+
+        with (
+            FakeServer(profile=Profile(tokens=1)) as server,
+            FakeServer(profile=Profile(tokens=1, reply="yes", latency=0.2)) as yes,
+            FakeServer(profile=Profile(tokens=1, reply="no", latency=0.2)) as no,
+            FakeServer(profile=Profile(tokens=1, latency=0.4)) as slow,
+        ):
+            with self.subTest("discard"):
+                # the end evaluation replies no, the summary started with it is not concluded
+                _, ms = await meeting(
+                    server,
+                    2,
+                    6,
+                    "--eval_mode",
+                    "speculative",
+                    "--disable_stream",
+                    system=[{"name": "end", "base_url": no.base_url}, {"name": "summary", "base_url": slow.base_url}],
+                )
+                self.assertEqual([(4, "end"), (6, "end")], evaluations(ms))
+                self.assertEqual(2, slow.requests, "speculative summaries")
+            with self.subTest("commit"):
+                # the slower summary is concluded before the other evaluator
+                _, ms = await meeting(
+                    server,
+                    2,
+                    6,
+                    "--eval_mode",
+                    "speculative",
+                    "--disable_stream",
+                    system=[
+                        {"name": "end", "base_url": yes.base_url},
+                        {"name": "summary", "base_url": slow.base_url},
+                        {"name": "e1", "desc": "e1"},
+                    ],
+                )
+                self.assertEqual([(4, "end"), (4, "summary"), (4, "e1")], evaluations(ms))
+
+    async def test_parallel(self):
+        def system(summary: FakeServer, e1: FakeServer, e2: FakeServer) -> list[dict]:
+            return [
+                {"name": "end", "base_url": yes.base_url},
+                {"name": "summary", "base_url": summary.base_url},
+                {"name": "e1", "desc": "e1", "base_url": e1.base_url},
+                {"name": "e2", "desc": "e2", "base_url": e2.base_url},
+            ]
+
+        with (
+            FakeServer(profile=Profile(tokens=1)) as server,
+            FakeServer(profile=Profile(tokens=1, reply="yes")) as yes,
+            tempfile.TemporaryDirectory() as d,
+        ):
+            eval_out = Path(d) / "eval.yml"
+            with (
+                self.subTest("order"),
+                FakeServer(profile=Profile(tokens=1, reply="s", latency=0.4)) as summary,
+                FakeServer(profile=Profile(tokens=1, reply="r1", latency=0.0)) as e1,
+                FakeServer(profile=Profile(tokens=1, reply="r2", latency=0.2)) as e2,
+            ):
+                # the evaluators finish in the reverse order
+                _, ms = await meeting(
+                    server,
+                    2,
+                    6,
+                    *["--eval_mode", "parallel", "--disable_stream", "-e", str(eval_out)],
+                    system=system(summary, e1, e2),
+                )
+                self.assertEqual([{"summary": "s"}, {"e1": "r1"}, {"e2": "r2"}], yaml_loads(eval_out.read_text()))
+                self.assertEqual(["end", "summary", "e1", "e2"], [x["name"] for x in ms if x["kind"] == "evaluator"])
+            for title, concurrency, want in [("unlimited", 0, 3), ("limited", 2, 2)]:
+                with (
+                    self.subTest(title),
+                    FakeServer(profile=Profile(tokens=1, latency=0.2)) as shared,
+                ):
+                    await meeting(
+                        server,
+                        2,
+                        6,
+                        *["--eval_mode", "parallel", "--eval_concurrency", str(concurrency), "--disable_stream"],
+                        system=system(shared, shared, shared),
+                    )
+                    self.assertEqual(3, shared.requests)
+                    self.assertEqual(want, shared.max_in_flight)
+
+    async def test_pipeline(self):
+        testcases = [
+            ("continue", "no", 6, 6),
+            # the reply of turn 5 generated during the evaluation of turn 4 is discarded
+            ("end", "yes", 4, 5),
+        ]
+        for title, reply, want_messages, want_requests in testcases:
+            with (
+                self.subTest(title),
+                FakeServer(profile=Profile(tokens=1)) as server,
+                FakeServer(profile=Profile(tokens=1, reply=reply, latency=0.3)) as evaluator,
+            ):
+                messages, ms = await meeting(
+                    server,
+                    2,
+                    6,
+                    "--pipeline",
+                    "--disable_stream",
+                    system=[
+                        {"name": "end", "base_url": evaluator.base_url},
+                        {"name": "summary", "base_url": evaluator.base_url},
+                    ],
+                )
+                self.assertEqual(want_requests, server.requests)
+                self.assertEqual(["s1", "s2"] * (want_messages // 2), [x.speaker for x in messages])
+                self.assertEqual(list(range(1, want_messages + 1)), [x["turn"] for x in ms if x["kind"] == "bot"])
+
+    async def test_panel(self):
+        # the fake server replies w<number of input messages>.<token index>
+        with FakeServer(profile=Profile(tokens=1)) as server:
+            messages, ms = await meeting(server, 3, 7, "-s", "-1", "--round_mode", "panel", "--disable_stream")
+        self.assertEqual(["s1", "s2", "s3", "s1", "s2", "s3", "s1"], [x.speaker for x in messages])
+        rounds = [{x.content for x in messages[i : i + 3]} for i in range(0, 7, 3)]
+        self.assertEqual([1, 1, 1], [len(x) for x in rounds], "bots of a round read the same thread")
+        self.assertEqual(3, len(set.union(*rounds)))
+        self.assertEqual([1, 2, 3, 4, 5, 6, 7], [x["turn"] for x in ms])
+
+    async def test_panel_eval(self):
+        # the end evaluation replies no, it runs after the rounds of 2 turns from the second round
+        with FakeServer(profile=Profile(tokens=1)) as server:
+            _, ms = await meeting(server, 2, 6, "--round_mode", "panel", "--disable_stream")
+        self.assertEqual([4, 6], [x["turn"] for x in ms if x["kind"] == "evaluator"])
+
+    async def test_summary_interval(self):
+        def summaries(ms: list[dict]) -> list[int]:
+            return [x["turn"] for x in ms if x["kind"] == "evaluator" and x["name"] == "summary"]
+
+        log()  # set up the logger before assertLogs sets its level
+        with FakeServer(profile=Profile(tokens=1, latency=0.1)) as server:
+            with self.subTest("every 2 turns"), FakeServer(profile=Profile(tokens=1)) as summary:
+                # the update scheduled after turn 2 and 4 ends during the next turn, the one after turn 6 is cancelled
+                _, ms = await meeting(
+                    server,
+                    2,
+                    6,
+                    *["-s", "-1", "--disable_stream", "--summary_interval", "2"],
+                    system=[{"name": "summary", "base_url": summary.base_url}],
+                )
+                self.assertEqual([3, 5], summaries(ms))
+            with (
+                self.subTest("skip while running"),
+                FakeServer(profile=Profile(tokens=1, latency=0.35)) as summary,
+                self.assertLogs("ai_roundtable.log", "DEBUG") as logs,
+            ):
+                # an update takes a few turns, the updates of the turns in between are skipped
+                await meeting(
+                    server,
+                    2,
+                    6,
+                    *["-s", "-1", "--disable_stream", "--summary_interval", "1"],
+                    system=[{"name": "summary", "base_url": summary.base_url}],
+                )
+                updated = [x for x in logs.output if x.endswith(", update summary")]
+                skipped = [x for x in logs.output if "skip summary update because the previous one is running" in x]
+                self.assertEqual(6, len(updated) + len(skipped))
+                self.assertGreater(len(skipped), 0)
+                self.assertLess(summary.requests, 6)
+
+    async def test_summary_interval_failure(self):
+        # the summary evaluator fails on its own server, the meeting goes on and the failure is logged
+        log()  # set up the logger before assertLogs sets its level
+        with (
+            FakeServer(profile=Profile(tokens=1, latency=0.2)) as server,
+            FakeServer(profile=Profile(statuses=[400] * 4)) as failing,
+            self.assertLogs("ai_roundtable.log", "WARNING") as logs,
+        ):
+            messages, _ = await meeting(
+                server,
+                2,
+                4,
+                *["-s", "-1", "--disable_stream", "--summary_interval", "2"],
+                system=[{"name": "summary", "base_url": failing.base_url}],
+            )
+        self.assertEqual(4, len(messages))
+        self.assertTrue(any("summary update failed" in x for x in logs.output), logs.output)
+
+    async def test_rolling_summary(self):
+        # the speakers share a context, the summary folds 2 messages at once out of the window of 2 latest messages
+        with FakeServer(profile=Profile(tokens=1)) as server:
+            _, ms = await meeting(
+                server, 3, 8, "-s", "-1", "--disable_stream", context={"latest": 2, "summary": True, "summary_step": 2}
+            )
+        self.assertEqual([6, 8], [x["turn"] for x in ms if x["kind"] == "evaluator" and x["name"] == "summary"])
+
+    async def test_retry(self):
+        # the first request times out
+        with FakeServer(profile=Profile(tokens=1, latencies=[1.0])) as server:
+            messages, ms = await meeting(
+                server, 2, 2, "-s", "-1", "--disable_stream", retry={"timeout": 0.3, "retries": 1, "backoff": 0}
+            )
+            self.assertEqual(3, server.requests)
+        self.assertEqual(["s1", "s2"], [x.speaker for x in messages])
+        self.assertEqual([2, 1], [x["attempts"] for x in ms])
+
+    async def test_retry_exhausted(self):
+        with FakeServer(profile=Profile(tokens=1, latencies=[1.0, 1.0])) as server:
+            with self.assertRaises(TimeoutError):
+                await meeting(
+                    server, 2, 2, "-s", "-1", "--disable_stream", retry={"timeout": 0.2, "retries": 1, "backoff": 0}
+                )
+
+    async def test_retry_drop(self):
+        # the first stream drops after 2 tokens, the retry prints only the rest
+        with FakeServer(profile=Profile(tokens=4, drops=[2])) as server:
+            stdout = io.StringIO()
+            with contextlib.redirect_stdout(stdout):
+                messages, ms = await meeting(server, 2, 1, "-s", "-1", retry={"retries": 1, "backoff": 0})
+            self.assertEqual(2, server.requests)
+        self.assertEqual(f"{messages[0].content}\n", stdout.getvalue())
+        self.assertEqual([2], [x["attempts"] for x in ms])
+
+    async def test_retry_idle_timeout(self):
+        # the reply takes longer than the timeout, but a token arrives within the timeout
+        with FakeServer(profile=Profile(tokens=5, token_rate=10)) as server, contextlib.redirect_stdout(io.StringIO()):
+            _, ms = await meeting(server, 2, 1, "-s", "-1", retry={"timeout": 0.3, "retries": 1})
+            self.assertEqual(1, server.requests)
+        self.assertEqual([1], [x["attempts"] for x in ms])
+
+    async def test_retry_not_transient(self):
+        with FakeServer(profile=Profile(tokens=1, statuses=[400])) as server:
+            with self.assertRaises(openai.BadRequestError):
+                await meeting(server, 2, 1, "-s", "-1", "--disable_stream", retry={"retries": 2, "backoff": 0})
+            self.assertEqual(1, server.requests)
+
+    async def test_hedge(self):
+        with (
+            tempfile.TemporaryDirectory() as d,
+            FakeServer(profile=Profile(tokens=2, latency=2.0)) as slow,
+            FakeServer(profile=Profile(tokens=3)) as fast,
+        ):
+            stream_out = Path(d) / "stream.txt"
+            start = time.monotonic()
+            messages, ms = await meeting(
+                slow,
+                2,
+                2,
+                *["-s", "-1", "--disable_stream", "--stream_out", str(stream_out)],
+                retry={"hedge_after": 0.2, "hedge_base_url": fast.base_url},
+            )
+            self.assertLess(time.monotonic() - start, 2.0)
+            self.assertEqual((2, 2), (slow.requests, fast.requests))
+            # only the winner is streamed
+            self.assertEqual("".join(f"{x.content}\n" for x in messages), stream_out.read_text())
+            self.assertEqual(
+                [(True, fast.base_url, "streamed")] * 2, [(x["hedged"], x["base_url"], x["mode"]) for x in ms]
+            )
+        self.assertEqual([3, 3], [len(x.content.split()) for x in messages])
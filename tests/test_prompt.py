@@ -0,0 +1,60 @@
+from unittest import TestCase
+
+import ai_roundtable.config as config
+import ai_roundtable.prompt as prompt
+import ai_roundtable.window as window
+
+
+def messages(n: int) -> list[config.Message]:
+    return [config.Message(speaker=f"s{i % 2}", content=f"content {i}") for i in range(n)]
+
+
+def turns(context: config.Context, n: int) -> list[prompt.Prompt]:
+    """Return the prompts of s0 as the thread grows up to n messages."""
+    b = prompt.PromptBuilder(speaker="s0")
+    ms = messages(n)
+    r = []
+    for i in range(1, n + 1):
+        w = window.Window.select(ms[:i], context)
+        r.append(b.build("instructions", w.head + w.tail))
+    return r
+
+
+class TestPromptBuilder(TestCase):
+    def test_build(self):
+        ps = turns(config.Context(), 4)
+        self.assertEqual(
+            [
+                prompt.Message.assistant("s0: content 0"),
+                prompt.Message.user("s1: content 1"),
+                prompt.Message.assistant("s0: content 2"),
+                prompt.Message.user("s1: content 3"),
+            ],
+            ps[-1].messages,
+        )
+        for prev, p in zip(ps, ps[1:]):
+            # consecutive turns share the prefix as it was rendered
+            self.assertEqual(len(prev.messages), p.reused)
+            self.assertTrue(all(x is y for x, y in zip(prev.messages, p.messages)))
+            self.assertEqual(prev.size(), p.shared)
+
+    def test_instructions_changed(self):
+        b = prompt.PromptBuilder(speaker="s0")
+        ms = messages(2)
+        b.build("instructions", ms[:1])
+        p = b.build("new instructions", ms)
+        self.assertEqual((0, 0), (p.reused, p.shared))
+
+    def test_fold_step(self):
+        def breaks(context: config.Context) -> int:
+            ps = turns(context, 20)
+            return sum(p.reused < len(prev.messages) for prev, p in zip(ps, ps[1:]))
+
+        testcases = [
+            ("unlimited", config.Context(), 0),
+            ("latest", config.Context(latest=4), 15),
+            ("fold step", config.Context(latest=4, fold_step=3), 5),
+        ]
+        for title, context, want in testcases:
+            with self.subTest(title):
+                self.assertEqual(want, breaks(context))
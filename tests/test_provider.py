@@ -0,0 +1,78 @@
+import asyncio
+import time
+from unittest import TestCase
+
+import ai_roundtable.provider as provider
+
+
+class TestClientRegistry(TestCase):
+    def test_get(self):
+        r = provider.ClientRegistry(limits=provider.PoolLimits(max_connections=4, max_keepalive_connections=2))
+        a = r.get(base_url="http://localhost:11434/v1", api_key="k")
+        with self.subTest("reuse same endpoint"):
+            self.assertIs(a, r.get(base_url="http://localhost:11434/v1", api_key="k"))
+        with self.subTest("another api key"):
+            self.assertIsNot(a, r.get(base_url="http://localhost:11434/v1", api_key="k2"))
+        with self.subTest("another base url"):
+            self.assertIsNot(a, r.get(base_url="http://localhost:8080/v1", api_key="k"))
+        self.assertEqual(3, len(r))
+        asyncio.run(r.aclose())
+        self.assertEqual(0, len(r))
+
+
+class TestEndpointLimiter(TestCase):
+    def test_max_in_flight(self):
+        async def run() -> tuple[int, list[tuple[int, int]]]:
+            x = provider.EndpointLimiter(base_url="", limits=provider.RateLimits(max_in_flight=2))
+            peak = 0
+            loads = []
+
+            async def request() -> None:
+                nonlocal peak
+                await x.acquire()
+                peak = max(peak, x.in_flight)
+                await asyncio.sleep(0.01)
+                await x.release()
+
+            provider.load_listener.set(lambda in_flight, queued: loads.append((in_flight, queued)))
+            await asyncio.gather(*[request() for _ in range(5)])
+            self.assertEqual((0, 0), (x.in_flight, x.queued))
+            return peak, loads
+
+        self.assertEqual((2, [(0, 0), (1, 0), (2, 0), (2, 1), (2, 2)]), asyncio.run(run()))
+
+    def test_rate(self):
+        async def run() -> float:
+            x = provider.EndpointLimiter(base_url="", limits=provider.RateLimits(rate=50, burst=2))
+            start = time.monotonic()
+            for _ in range(4):
+                await x.acquire()
+                await x.release()
+            return time.monotonic() - start
+
+        # 2 at once by burst, then 2 more at 50 per second
+        self.assertGreaterEqual(asyncio.run(run()), 0.035)
+
+    def test_adaptive(self):
+        async def run() -> list[float]:
+            x = provider.EndpointLimiter(base_url="", limits=provider.RateLimits(max_in_flight=8, adaptive=True))
+            for _ in range(4):
+                await x.acquire()
+            r = []
+            for status in [429, 429, 200, 200, 503]:
+                await x.observe(status)
+                r.append(round(x.window, 3))
+            self.assertEqual(3, x.overloaded)
+            return r
+
+        # halve by the requests in flight, ignore the overload of the same window, widen by one per window
+        self.assertEqual([2.0, 2.0, 2.5, 2.9, 1.45], asyncio.run(run()))
+
+    def test_not_adaptive(self):
+        async def run() -> float:
+            x = provider.EndpointLimiter(base_url="", limits=provider.RateLimits(max_in_flight=8))
+            await x.observe(429)
+            self.assertEqual(1, x.overloaded)
+            return x.window
+
+        self.assertEqual(8, asyncio.run(run()))
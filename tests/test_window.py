@@ -0,0 +1,72 @@
+from unittest import TestCase
+
+import ai_roundtable.config as config
+import ai_roundtable.window as window
+
+
+def messages(n: int) -> list[config.Message]:
+    return [config.Message(speaker=f"s{i % 2}", content="x" * 39) for i in range(n)]
+
+
+class TestWindow(TestCase):
+    def test_select(self):
+        ms = messages(6)
+        testcases = [
+            (
+                "unlimited",
+                config.Context(),
+                window.Window(head=ms[:1], tail=ms[1:]),
+            ),
+            (
+                "unlimited without first",
+                config.Context(keep_first=False),
+                window.Window(tail=ms),
+            ),
+            (
+                "latest",
+                config.Context(latest=2),
+                window.Window(head=ms[:1], folded=ms[1:4], tail=ms[4:]),
+            ),
+            (
+                "max tokens",
+                # a message is 11 tokens
+                config.Context(max_tokens=35),
+                window.Window(head=ms[:1], folded=ms[1:4], tail=ms[4:]),
+            ),
+            (
+                "max tokens keeps the last message",
+                config.Context(max_tokens=1, keep_first=False),
+                window.Window(folded=ms[:5], tail=ms[5:]),
+            ),
+            (
+                "latest and max tokens",
+                config.Context(latest=3, max_tokens=35),
+                window.Window(head=ms[:1], folded=ms[1:4], tail=ms[4:]),
+            ),
+            (
+                "fold step",
+                config.Context(latest=2, fold_step=2),
+                window.Window(head=ms[:1], folded=ms[1:5], tail=ms[5:]),
+            ),
+            (
+                "fold step of max tokens",
+                config.Context(max_tokens=35, fold_step=2),
+                window.Window(head=ms[:1], folded=ms[1:5], tail=ms[5:]),
+            ),
+        ]
+        for title, context, want in testcases:
+            with self.subTest(title):
+                got = window.Window.select(ms, context)
+                self.assertEqual(want, got)
+
+    def test_context_of(self):
+        c = config.Config(
+            speakers=[
+                config.Speaker(name="s1"),
+                config.Speaker(name="s2", context=config.Context(latest=3)),
+            ],
+            main_thread=config.MainThread(messages=[]),
+            context=config.Context(latest=5),
+        )
+        self.assertEqual(config.Context(latest=5), c.context_of(c.speakers[0]))
+        self.assertEqual(config.Context(latest=3), c.context_of(c.speakers[1]))
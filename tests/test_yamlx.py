@@ -0,0 +1,66 @@
+import random
+import textwrap
+from unittest import TestCase, skipUnless
+
+import ai_roundtable.yamlx as yamlx
+
+
+class TestYamlx(TestCase):
+    def test_literal(self):
+        got = yamlx.dumps([{"speaker": "s1", "content": "line1\nline2", "tags": ("t1",)}])
+        want = textwrap.dedent(
+            """\
+            - content: |-
+                line1
+                line2
+              speaker: s1
+              tags:
+              - t1
+            """
+        )
+        self.assertEqual(want, got)
+
+    @skipUnless(yamlx.libyaml, "libyaml is not available")
+    def test_identical(self):
+        testcases = [
+            "plain",
+            "",
+            "line1\nline2",
+            "line1\nline2\n",
+            "\nleading break",
+            " leading space\nline2",
+            "trailing space \nline2",
+            "trailing space\nline2 ",
+            "trailing breaks\n\n",
+            "\n",
+            "emoji 😀",
+            "emoji\n😀",
+            "日本語\n　全角スペース",
+            "tab\tseparated",
+            "line separator\u2028paragraph separator\u2029",
+            "a\n\u2028",
+            "a\n\u2029",
+            "word " * 40 + "\u2028" + "word " * 40,
+            "control \x07",
+            "quotes \"'\n:#-|>{}[]&*!%@`",
+            "word " * 40,
+            "word " * 40 + "\n" + "語" * 100,
+            "1.5",
+            "null",
+            "yes",
+        ]
+        for s in testcases:
+            with self.subTest(s=s):
+                obj = [{"speaker": "s1", "content": s, "n": 1, "f": 1.5, "z": None}, {"after": True}]
+                self.assertEqual(yamlx.dumps(obj, pure=True), yamlx.dumps(obj))
+                self.assertEqual(obj, yamlx.loads(yamlx.dumps(obj)))
+
+    @skipUnless(yamlx.libyaml, "libyaml is not available")
+    def test_identical_random(self):
+        r = random.Random(1)
+        chars = "ab c\n:#-'\"é日本😀\t \u2028\u2029"
+        for _ in range(300):
+            obj = [{"content": "".join(r.choice(chars) for _ in range(r.randint(0, 200)))} for _ in range(3)]
+            got = yamlx.dumps(obj)
+            self.assertEqual(yamlx.dumps(obj, pure=True), got)
+            self.assertEqual(yamlx.loads(got, pure=True), yamlx.loads(got))